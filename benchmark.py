@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import tempfile
+import itertools
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from compiled_forward import BACKENDS
+from synthetic_model import STICKMAN_MISSING_JOINTS, synthetic_sequence, write_synthetic_model
+from output_writer import OutputWriter
+from checkpoint import fit_with_checkpoints
+from parallel_fit import fit_frames_sharded, open_pool
+from fitting import (
+    COLD_SCHEDULE,
+    IK_SCHEDULE,
+    LM_SCHEDULE,
+    LM_WARM_SCHEDULE,
+    WARM_SCHEDULE,
+    fit_frames_chunked,
+    fit_frames_warm_start,
+)
+
+# ─── Fitting throughput benchmark ─────────────────────────────────────────────
+# Runs the fitter end to end (chunked fitting into the output memmaps, optionally
+# sharded over worker processes) on synthetic joint sequences and reports frames/sec,
+# wall time per stage, peak RSS and residuals for every combination of sequence length,
+# batch size, worker count and schedule. Without --model it runs on a generated
+# stand-in model (synthetic_model.py). Every run is a fresh process, so model loading
+# and peak memory are measured per run. Results are written as JSON for tracking
+# regressions between commits.
+
+SCHEDULES = {
+    "cold": (COLD_SCHEDULE, WARM_SCHEDULE),
+    "ik": (IK_SCHEDULE, WARM_SCHEDULE),
+    "lm": (LM_SCHEDULE, LM_WARM_SCHEDULE),
+}
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux (bytes on macOS)
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def environment():
+    """Machine and code version the results were measured with."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def silence_stdout():
+    """Send fd 1 to /dev/null, which silences the fitting log of this process and of the
+    shard workers it starts (they inherit fd 1)."""
+    sys.stdout.flush()
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def run_config(config):
+    """One benchmark run (executed in a fresh process). Returns config plus measurements."""
+    if not config["verbose"]:
+        silence_stdout()
+    setup_start = time.perf_counter()
+    joints, _ = synthetic_sequence(config["model"], config["frames"], config["seed"], missing_joints=[])
+    partial = joints.copy()
+    partial[:, STICKMAN_MISSING_JOINTS] = 0.0
+    cold_schedule, warm_schedule = (dict(s) for s in SCHEDULES[config["schedule"]])
+    cold_schedule["compile"] = warm_schedule["compile"] = {"backend": config["compile"]}
+    if config["warm_start"]:
+        fit_fn = fit_frames_warm_start
+        fit_kwargs = dict(n_lanes=config["batch_size"], cold_schedule=cold_schedule, warm_schedule=warm_schedule)
+    else:
+        fit_fn = fit_frames_chunked
+        fit_kwargs = dict(batch_size=config["batch_size"], schedule=cold_schedule)
+
+    workers = config["workers"]
+    pool = open_pool(workers) if workers > 1 else contextlib.nullcontext()
+
+    def fit_frames(frames):
+        if workers > 1:
+            return fit_frames_sharded(frames, config["model"], fit_fn, fit_kwargs, workers=workers, pool=pool)
+        return fit_fn(frames, config["model"], **fit_kwargs)
+
+    with tempfile.TemporaryDirectory() as out_dir, pool:
+        writer = OutputWriter(None, os.path.join(out_dir, "joints.npy"), len(partial))
+        setup = time.perf_counter() - setup_start
+        start = time.perf_counter()
+        # like pipeline.fit_chunks: chunk_size frames per worker and chunk
+        fit_with_checkpoints(partial, config["model"], fit_frames, writer.write,
+                             chunk_size=config["chunk_size"] * workers)
+        wall = time.perf_counter() - start
+        error = np.linalg.norm(np.asarray(writer.joints)[:, :joints.shape[1]] - joints, axis=-1)
+        writer.close()
+
+    return {
+        **{key: value for key, value in config.items() if key != "verbose"},
+        "setup_s": setup,
+        "wall_s": wall,
+        "fps": len(partial) / wall,
+        # summed over the frames; with several workers this is the sum over the workers
+        "stage_s": {stage: float(seconds.sum()) for stage, seconds in writer.timings.items()},
+        "iterations_mean": {stage: float(used.mean()) for stage, used in writer.iterations.items()},
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_worker_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource and config["workers"] > 1 else None,
+        "residual_mean": float(writer.residual.mean()),
+        "residual_max": float(writer.residual.max()),
+        # distance to the ground-truth joints, including the joints missing from the input
+        "joint_error_mean": float(error.mean()),
+        "missing_joint_error_mean": float(error[:, STICKMAN_MISSING_JOINTS].mean()),
+    }
+
+
+def run_isolated(config, run=run_config):
+    """run(config) in a fresh spawned process; run must be a module-level function."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run, config).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fitter on synthetic joint sequences")
+    parser.add_argument("--model", type=str, default=None,
+                        help="SMPL-X model folder (default: generate a synthetic stand-in in --work_dir)")
+    parser.add_argument("--work_dir", type=str, default=os.path.join(tempfile.gettempdir(), "smplx_benchmark"),
+                        help="Folder for the generated model and its caches (default: <tmp>/smplx_benchmark)")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[64, 256], help="Sequence lengths in frames (default: 64 256)")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[16, 64], help="Batch sizes (default: 16 64)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Worker process counts (default: 1)")
+    parser.add_argument("--schedules", choices=sorted(SCHEDULES), nargs="+", default=["ik", "lm"],
+                        help="cold: COLD_SCHEDULE, ik: IK_SCHEDULE, lm: LM_SCHEDULE (default: ik lm)")
+    parser.add_argument("--warm_start", action="store_true", help="Benchmark warm-start fitting (batch size = lanes)")
+    parser.add_argument("--compile", choices=BACKENDS, default="eager", help="Forward backend (default: eager)")
+    parser.add_argument("--chunk_size", type=int, default=100, help="Frames fitted and written at a time (default: 100)")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per configuration (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic motion (default: 0)")
+    parser.add_argument("--out", type=str, default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--verbose", action="store_true", help="Show the fitting log")
+    args = parser.parse_args()
+
+    model = args.model
+    if model is None:
+        model = os.path.join(args.work_dir, "model")
+        if not os.path.exists(os.path.join(model, "smplx", "SMPLX_MALE.npz")):
+            print(f"Generating synthetic model → {write_synthetic_model(model)}")
+
+    runs = []
+    grid = itertools.product(args.lengths, args.batch_sizes, args.workers, args.schedules, range(args.repeats))
+    for frames, batch_size, workers, schedule, repeat in grid:
+        config = dict(model=model, frames=frames, batch_size=batch_size, workers=workers, schedule=schedule,
+                      warm_start=args.warm_start, compile=args.compile, chunk_size=args.chunk_size,
+                      seed=args.seed, repeat=repeat, verbose=args.verbose)
+        result = run_isolated(config)
+        runs.append(result)
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["stage_s"].items() if seconds)
+        print(f"frames {frames:5d}  batch {batch_size:4d}  workers {workers:2d}  {schedule:4s}  "
+              f"{result['fps']:7.2f} fps  residual {result['residual_mean']:.5f}  "
+              f"rss {result['peak_rss_mb'] or 0:.0f} MB  [{stages}]", flush=True)
+
+        # rewrite after every run so an interrupted sweep keeps its results
+        with open(args.out, "w") as f:
+            json.dump({"environment": environment(), "runs": runs}, f, indent=2)
+    print(f"Saved {len(runs)} runs → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
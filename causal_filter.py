@@ -0,0 +1,68 @@
+from collections import deque
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+# ─── Causal low-pass for streamed output ──────────────────────────────────────
+# smooth_time in get_mesh_from_3dpoints.py runs the Butterworth filter forward and
+# backward over the whole take (zero phase), which needs the last frame before the
+# first one can be written. CausalLowpass runs the same filter one frame at a time
+# with persistent state. With lag=0 it is a plain causal filter, which delays the motion
+# by the filter's group delay. With lag=L every output frame waits for L newer frames:
+# the backward pass is then run over those L frames only, which removes most of the
+# delay at a latency of L frames. Deviation from smooth_time on the fitted joints in
+# data/all_joints.npy (4 Hz at 30 fps), over frames 10..T-10; the first and last frames
+# differ more because smooth_time extends the take at both ends before filtering:
+#
+#     lag  0: mean 7.2 mm, p95 18 mm,  max 289 mm  (the unfiltered joints: mean 3.6 mm)
+#     lag  4: mean 0.7 mm, p95 1.9 mm, max 32 mm
+#     lag  8: mean 0.2 mm, p95 0.4 mm, max 6.8 mm
+#     lag 12: mean 0.03 mm, p95 0.09 mm, max 1.9 mm
+
+
+class CausalLowpass:
+    """
+    Butterworth low-pass (cutoff_hz at fs, like get_mesh_from_3dpoints.lowpass_sos) for
+    frames of any fixed shape, fed one frame at a time. step() returns the smoothed
+    frame `lag` frames back, or None while the first lag frames are buffered;
+    flush() returns the frames still buffered at the end of the stream.
+    """
+
+    def __init__(self, cutoff_hz, fs=30.0, order=3, lag=0):
+        self.sos = butter(order, cutoff_hz / (0.5 * fs), btype="low", output="sos")
+        self.zi = sosfilt_zi(self.sos)  # (sections, 2) steady state for a unit input
+        self.lag = lag
+        self.reset()
+
+    def reset(self):
+        """Forget the stream, e.g. when a new take starts."""
+        self.state = None
+        self.shape = None
+        self.forward = deque(maxlen=self.lag + 1)
+
+    def _backward(self, begin):
+        # the filter run backward from the newest forward output, ending at frame `begin` of the buffer
+        window = np.array(self.forward)[begin:][::-1]
+        out, _ = sosfilt(self.sos, window, axis=0, zi=self.zi[:, :, None] * window[0])
+        return out[-1].reshape(self.shape)
+
+    def step(self, frame):
+        frame = np.asarray(frame, dtype=np.float64)
+        flat = frame.reshape(1, -1)
+        if self.state is None:
+            # start in the steady state of the first frame, so there is no start-up transient
+            self.shape = frame.shape
+            self.state = self.zi[:, :, None] * flat
+        filtered, self.state = sosfilt(self.sos, flat, axis=0, zi=self.state)
+        self.forward.append(filtered[0])
+        if len(self.forward) <= self.lag:
+            return None
+        return self._backward(0)
+
+    def flush(self):
+        """The smoothed frames that step() has not returned yet, oldest first."""
+        if self.state is None:
+            return []
+        first = 1 if len(self.forward) > self.lag else 0
+        frames = [self._backward(begin) for begin in range(first, len(self.forward))]
+        self.reset()
+        return frames
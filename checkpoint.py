@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import numpy as np
+from fitting import slice_result
+
+# ─── Chunked checkpoints for long fits ────────────────────────────────────────
+# The sequence is fitted in chunks of frames. When checkpointing, every finished chunk
+# is written to <checkpoint_dir>/chunk_<start>_<stop>.npz right away, so a killed run
+# can pick up again from the first chunk that is missing.
+
+
+def chunk_ranges(n_frames, chunk_size):
+    return [(start, min(start + chunk_size, n_frames)) for start in range(0, n_frames, chunk_size)]
+
+
+def chunk_path(checkpoint_dir, start, stop):
+    return os.path.join(checkpoint_dir, f"chunk_{start:06d}_{stop:06d}.npz")
+
+
+def _jsonable(value):
+    return value.tolist() if hasattr(value, "tolist") else str(value)
+
+
+def input_signature(partial_joints_np, smplx_model_path, chunk_size, settings=None):
+    """
+    Identifies the run a checkpoint directory belongs to. settings: everything else that
+    changes the fitted result (mode, schedules, betas, batch size, ...), JSON-serializable
+    apart from numpy arrays.
+    """
+    return {
+        "joints_sha1": hashlib.sha1(np.ascontiguousarray(partial_joints_np).tobytes()).hexdigest(),
+        "n_frames": int(len(partial_joints_np)),
+        "model": os.path.abspath(smplx_model_path),
+        "chunk_size": int(chunk_size),
+        # round-tripped, so it compares equal to the signature read back from checkpoint.json
+        "settings": json.loads(json.dumps(settings or {}, sort_keys=True, default=_jsonable)),
+    }
+
+
+def _flatten(fit, prefix=""):
+    flat = {}
+    for key, value in fit.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}/"))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def _unflatten(flat):
+    fit = {}
+    for key, value in flat.items():
+        *parents, leaf = key.split("/")
+        node = fit
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = value
+    return fit
+
+
+def save_chunk(checkpoint_dir, start, stop, fit):
+    path = chunk_path(checkpoint_dir, start, stop)
+    tmp = path[:-len(".npz")] + ".tmp.npz"
+    np.savez(tmp, **_flatten(fit))
+    os.replace(tmp, path)  # a chunk file is either complete or absent
+
+
+def load_chunk(checkpoint_dir, start, stop):
+    with np.load(chunk_path(checkpoint_dir, start, stop)) as data:
+        return _unflatten({key: data[key] for key in data.files})
+
+
+def iter_fitted_chunks(
+    partial_joints_np,
+    smplx_model_path,
+    fit_chunk,
+    checkpoint_dir=None,
+    chunk_size=100,
+    resume=False,
+    overlap=0,
+    settings=None,
+):
+    """
+    Fit the sequence chunk by chunk with fit_chunk(frames) -> result dict and yield
+    (start, fit) for every finished chunk, so only one chunk is held in memory.
+    With a checkpoint_dir every chunk is also checkpointed, and with resume=True the chunks
+    already present there are loaded instead of fitted, after checking that the directory
+    was written for the same joints, model, chunk_size and settings (see input_signature).
+    Like the process-pool shards, each chunk also fits the `overlap` frames before it and
+    drops them, so sequential modes are warm at the chunk boundary.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        meta_path = os.path.join(checkpoint_dir, "checkpoint.json")
+        signature = input_signature(partial_joints_np, smplx_model_path, chunk_size, settings)
+        if resume and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                previous = json.load(f)
+            if previous != signature:
+                differing = sorted(key for key in signature if previous.get(key) != signature[key])
+                raise ValueError(f"Checkpoints in {checkpoint_dir} belong to a different run "
+                                 f"(different {', '.join(differing)})")
+        else:
+            for name in os.listdir(checkpoint_dir):
+                if name.startswith("chunk_") and name.endswith(".npz"):
+                    os.remove(os.path.join(checkpoint_dir, name))
+            with open(meta_path, "w") as f:
+                json.dump(signature, f, indent=2)
+    elif resume:
+        raise ValueError("resume needs a checkpoint_dir")
+
+    for start, stop in chunk_ranges(len(partial_joints_np), chunk_size):
+        if resume and os.path.exists(chunk_path(checkpoint_dir, start, stop)):
+            print(f"Resuming: frames {start+1}-{stop} loaded from checkpoint")
+            yield start, load_chunk(checkpoint_dir, start, stop)
+            continue
+        warmup_start = max(0, start - overlap)
+        fit = slice_result(fit_chunk(partial_joints_np[warmup_start:stop]), start - warmup_start)
+        if checkpoint_dir:
+            save_chunk(checkpoint_dir, start, stop, fit)
+            print(f"Checkpointed frames {start+1}-{stop} → {chunk_path(checkpoint_dir, start, stop)}")
+        yield start, fit
+
+
+def fit_with_checkpoints(partial_joints_np, smplx_model_path, fit_chunk, on_chunk, checkpoint_dir=None,
+                         chunk_size=100, resume=False, overlap=0, settings=None):
+    """iter_fitted_chunks handing every chunk to on_chunk(start, fit)."""
+    for start, fit in iter_fitted_chunks(partial_joints_np, smplx_model_path, fit_chunk, checkpoint_dir,
+                                         chunk_size, resume, overlap, settings):
+        on_chunk(start, fit)
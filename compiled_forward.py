@@ -0,0 +1,115 @@
+import os
+import warnings
+import weakref
+import torch
+from shaped_model import shaped_template_file
+
+# ─── Compiled forward + loss (opt-in) ─────────────────────────────────────────
+# The fitting loop calls the same small graph (pose -> joints -> weighted loss) hundreds
+# of times per chunk. "trace" records it once with torch.jit.trace and stores the
+# TorchScript artifact next to the shaped template
+# (<model stem>_shaped/<betas hash>_<tag>.pt), so later runs only load it. The trace
+# reads the batch size from the inputs, so one artifact serves every chunk size and the
+# shrinking batches of early stopping. "inductor" uses torch.compile, whose generated
+# kernels are kept in the inductor cache under <model stem>_shaped/inductor. Either
+# backend falls back to the eager function when compilation is not available.
+
+BACKENDS = ("eager", "trace", "inductor")
+
+_COMPILED = weakref.WeakKeyDictionary()
+
+
+def compiled_cache_file(model_path, betas, tag, gender="male"):
+    """Path of the on-disk TorchScript artifact of a function of the shaped model."""
+    base = os.path.splitext(shaped_template_file(model_path, betas, gender))[0]
+    version = torch.__version__.split("+")[0]
+    return f"{base}_{tag}_torch{version}.pt"
+
+
+def _load_trace(path, depends_on, device):
+    # stale when the model or the code that produced the graph changed since
+    if not os.path.exists(path) or any(os.path.getmtime(path) < os.path.getmtime(d) for d in depends_on):
+        return None
+    try:
+        return torch.jit.load(path, map_location=device)
+    except Exception as e:
+        print(f"Could not load compiled forward {path} ({e}), tracing it again")
+        return None
+
+
+def _trace(fn, example_inputs, cache_file, depends_on):
+    device = example_inputs[0].device
+    traced = _load_trace(cache_file, depends_on, device) if cache_file else None
+    if traced is not None:
+        return traced
+    with warnings.catch_warnings():
+        # the branches the tracer warns about test the model's joint counts, not the batch
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        traced = torch.jit.trace(fn, tuple(t.detach() for t in example_inputs), check_trace=False)
+    if cache_file:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp = f"{cache_file}.{os.getpid()}.tmp"  # sharded workers may write the same artifact at once
+        torch.jit.save(traced, tmp)
+        os.replace(tmp, cache_file)
+    return traced
+
+
+def _inductor(fn, cache_file):
+    if cache_file:
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(os.path.dirname(cache_file), "inductor"))
+    return torch.compile(fn)
+
+
+class _WithFallback:
+    """Calls the compiled function and switches to the eager one for good if it fails."""
+
+    def __init__(self, compiled, eager, label):
+        self.compiled = compiled
+        self.eager = eager
+        self.label = label
+
+    def __call__(self, *args):
+        if self.compiled is not None:
+            try:
+                return self.compiled(*args)
+            except Exception as e:
+                print(f"[{self.label}] compiled forward failed ({e}), continuing eagerly")
+                self.compiled = None
+        return self.eager(*args)
+
+
+def compile_function(fn, example_inputs, backend="trace", cache_file=None, depends_on=(), label="compile"):
+    """
+    fn compiled with backend ("eager", "trace" or "inductor"). fn takes and returns tensors
+    only; example_inputs are used to trace it and to check the trace against the eager fn.
+    cache_file: where the traced artifact is stored (None: not stored); depends_on: files
+    whose modification invalidates it (the model, the code of fn).
+    Returns fn itself when the backend is "eager" or compilation fails.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown compile backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "eager":
+        return fn
+    try:
+        if backend == "inductor":
+            # torch.compile is lazy, errors surface on the first call (_WithFallback)
+            compiled = _inductor(fn, cache_file)
+        else:
+            compiled = _trace(fn, example_inputs, cache_file, depends_on)
+            with torch.no_grad():
+                expected, got = fn(*example_inputs), compiled(*example_inputs)
+            if not torch.allclose(expected, got, rtol=1e-4, atol=1e-7):
+                raise RuntimeError(f"result differs from eager by {(expected - got).abs().max().item():.3g}")
+    except Exception as e:
+        print(f"[{label}] {backend} compilation not available ({e}), using the eager forward")
+        return fn
+    return _WithFallback(compiled, fn, label)
+
+
+def get_compiled(owner, key, build):
+    """build() memoized per owner module and key, for as long as the owner is alive."""
+    cache = _COMPILED.setdefault(owner, {})
+    if key not in cache:
+        cache[key] = build()
+    return cache[key]
+
@@ -0,0 +1,83 @@
+import argparse
+import os
+import numpy as np
+import torch
+from numpy.lib.format import open_memmap
+from fitting import POSE_PARAM_SIZES
+from shaped_model import get_shaped_model
+
+# ─── Decode fitted SMPL-X parameters into vertices and joints ─────────────────
+# get_mesh_from_3dpoints.py stores the fitted parameters (all_params.npz, ~0.7 KB per
+# frame) next to the meshes. This regenerates vertices and joints for any frame range,
+# so downstream tools only decode the frames they actually use.
+
+
+def load_params(path):
+    """
+    Returns (params, betas, model_config): params maps the pose parameter names to
+    (T, size) arrays, betas is the (10,) shape shared by all frames and model_config
+    holds the smplx settings the parameters were fitted with.
+    """
+    with np.load(path) as data:
+        params = {name: data[name] for name in POSE_PARAM_SIZES}
+        betas = data["betas"]
+        model_config = {key[len("model_"):]: data[key].item() for key in data.files if key.startswith("model_")}
+    return params, betas, model_config
+
+
+def decode_frames(params, betas, smplx_model_path, start=0, stop=None, batch_size=256, device=None, **model_config):
+    """
+    Yields (frame_start, vertices (B, V, 3), joints (B, J, 3)) for the frames [start, stop)
+    in batches of batch_size frames.
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    shaped = get_shaped_model(smplx_model_path, betas, device=device, **model_config)
+    n_frames = len(params["transl"])
+    stop = n_frames if stop is None else min(stop, n_frames)
+    for begin in range(start, stop, batch_size):
+        end = min(begin + batch_size, stop)
+        batch = {name: torch.tensor(p[begin:end], dtype=torch.float32, device=device) for name, p in params.items()}
+        with torch.no_grad():
+            vertices, joints = shaped(**batch)
+        yield begin, vertices.cpu().numpy(), joints.cpu().numpy()
+
+
+def decode(params_path, smplx_model_path, start=0, stop=None, batch_size=256, device=None):
+    """(vertices, joints) arrays of the frames [start, stop) of a saved parameter file."""
+    params, betas, model_config = load_params(params_path)
+    vertices, joints = [], []
+    for _, v, j in decode_frames(params, betas, smplx_model_path, start, stop, batch_size, device, **model_config):
+        vertices.append(v)
+        joints.append(j)
+    return np.concatenate(vertices), np.concatenate(joints)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode fitted SMPL-X parameters into meshes and joints")
+    parser.add_argument("--params", type=str, default="data/all_params.npz", help="Parameter file (default: data/all_params.npz)")
+    parser.add_argument("--model", type=str, default="models", help="Path to SMPL-X model folder (default: ./models)")
+    parser.add_argument("--start", type=int, default=0, help="First frame to decode (default: 0)")
+    parser.add_argument("--stop", type=int, default=None, help="Frame after the last one to decode (default: end)")
+    parser.add_argument("--batch_size", type=int, default=256, help="Frames decoded per forward pass (default: 256)")
+    parser.add_argument("--out_meshes", type=str, default="data/decoded_meshes.npy", help="Output .npy file for meshes")
+    parser.add_argument("--out_joints", type=str, default="data/decoded_joints.npy", help="Output .npy file for joints")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.params):
+        raise FileNotFoundError(f"Parameter file not found: {args.params}")
+    params, betas, model_config = load_params(args.params)
+    stop = len(params["transl"]) if args.stop is None else min(args.stop, len(params["transl"]))
+    if not 0 <= args.start < stop:
+        parser.error(f"--start must be between 0 and {stop - 1} (frames of {args.params} before --stop), got {args.start}")
+
+    meshes = joints = None
+    for begin, v, j in decode_frames(params, betas, args.model, args.start, stop, args.batch_size, **model_config):
+        if meshes is None:
+            meshes = open_memmap(args.out_meshes, mode="w+", dtype=np.float32, shape=(stop - args.start,) + v.shape[1:])
+            joints = open_memmap(args.out_joints, mode="w+", dtype=np.float32, shape=(stop - args.start,) + j.shape[1:])
+        meshes[begin - args.start:begin - args.start + len(v)] = v
+        joints[begin - args.start:begin - args.start + len(j)] = j
+    meshes.flush()
+    joints.flush()
+    print(f"Decoded frames {args.start}-{stop} → {args.out_meshes}, {args.out_joints}")
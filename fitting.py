@@ -0,0 +1,882 @@
+import time
+import hashlib
+import inspect
+import torch
+import numpy as np
+from model_cache import get_model, source_model_file
+from joint_forward import get_joint_evaluator
+from shaped_model import ShapedModel, get_shaped_model
+from compiled_forward import compile_function, compiled_cache_file, get_compiled
+from lm_solver import solve_lm
+from lbfgs_solver import solve_lbfgs
+from ik_init import ik_initial_params
+from keyframes import interpolate_params, select_keyframes
+
+finger_indices = [
+        25, 26, 27, 67,  # left index
+        28, 29, 30, 68,  # left middle
+        31, 32, 33, 70,  # left pinky
+        34, 35, 36, 69, # left ring
+        37, 38, 39, 66, # left thumb
+        40, 41, 42, 72, # right index
+        43, 44, 45, 73, # right middle
+        46, 47, 48, 75,  # right pinky
+        49, 50, 51, 74, # right ring
+        52, 53, 54, 71, # right thumb
+        20, 21, # both wrists
+        # 18,19 #include elbows
+    ]
+
+POSE_PARAM_SIZES = {
+    "global_orient": 3,
+    "body_pose": 63,
+    "left_hand_pose": 45,
+    "right_hand_pose": 45,
+    "transl": 3,
+}
+
+
+# Loss weight of the finger joints relative to the body joints.
+FINGER_WEIGHT = 5.0
+
+
+def joint_weights(num_joints, device, finger_weight=FINGER_WEIGHT):
+    """(num_joints,) loss weights with the joints in finger_indices upweighted."""
+    weights = torch.ones(num_joints, device=device)
+    for idx in finger_indices:
+        if 0 <= idx < num_joints:
+            weights[idx] = finger_weight  # upweight fingers (tune this if needed)
+    return weights
+
+
+def per_frame_weighted_mse(pred_joints, target_joints, valid_mask, weights):
+    """
+    Weighted MSE over the valid joints of every frame, kept separate per frame.
+    pred_joints, target_joints: (T, J, 3)
+    valid_mask: (T, J) bool
+    weights: (J,)
+    Returns a (T,) tensor; frames without valid joints get a loss of 0.
+    """
+    diff = (pred_joints - target_joints) ** 2 * weights[None, :, None]
+    diff = diff * valid_mask.unsqueeze(-1)
+    count = valid_mask.sum(dim=1).clamp(min=1) * 3
+    return diff.sum(dim=(1, 2)) / count
+
+
+def smplx_forward(model, params, betas):
+    """Run the smplx model on a batch of pose parameters (face parameters kept at zero)."""
+    batch_size = betas.shape[0]
+    zeros3 = torch.zeros((batch_size, 3), device=betas.device)
+    return model(
+        betas=betas,
+        jaw_pose=zeros3,
+        leye_pose=zeros3,
+        reye_pose=zeros3,
+        expression=torch.zeros((batch_size, model.num_expression_coeffs), device=betas.device),
+        **params,
+    )
+
+
+def temporal_smoothness(params, names, velocity_weight=0.0, acceleration_weight=0.0):
+    """
+    Squared first/second differences along the frame axis of the (T, size) parameters in names.
+    Only meaningful when the rows of params are consecutive frames.
+    """
+    total = 0.0
+    for name in names:
+        p = params[name]
+        if velocity_weight and len(p) > 1:
+            total = total + velocity_weight * (p[1:] - p[:-1]).pow(2).sum()
+        if acceleration_weight and len(p) > 2:
+            total = total + acceleration_weight * (p[2:] - 2 * p[1:-1] + p[:-2]).pow(2).sum()
+    return total
+
+
+def compiled_joint_loss(shaped, weights, backend, model_path, betas, example_inputs):
+    """
+    per_frame_weighted_mse(shaped.joints(...), target, valid, weights) as a function of
+    (*pose parameters in POSE_PARAM_SIZES order, target, valid), compiled with backend
+    (see compiled_forward.py) once per shaped model and weights.
+    """
+    def joint_loss(global_orient, body_pose, left_hand_pose, right_hand_pose, transl, target, valid):
+        pred = shaped.joints(global_orient, body_pose, left_hand_pose, right_hand_pose, transl)
+        return per_frame_weighted_mse(pred, target, valid, weights)
+
+    if backend == "eager":
+        return joint_loss
+
+    # the weights are baked into a compiled loss
+    weights_key = weights.cpu().numpy().tobytes()
+
+    def build():
+        tag = f"joint_loss_{shaped.n_joints}"
+        if shaped.use_pca:
+            tag += f"_pca{shaped.left_hand_components.shape[0]}"
+        if not torch.equal(weights, joint_weights(len(weights), weights.device)):
+            tag += f"_w{hashlib.sha1(weights_key).hexdigest()[:8]}"
+        depends_on = [source_model_file(model_path), __file__, inspect.getfile(ShapedModel),
+                      inspect.getfile(get_joint_evaluator)]
+        return compile_function(
+            joint_loss, example_inputs, backend, compiled_cache_file(model_path, betas, f"{tag}_{weights.device.type}"),
+            depends_on, label="Compile",
+        )
+    return get_compiled(shaped, ("joint_loss", backend, weights_key), build)
+
+
+# Iteration budgets, learning rates and convergence tolerances of the three stages.
+# Cold starts begin from the zero pose; warm starts begin from a neighbouring frame's
+# solution, so they skip the coarse body stage and only refine briefly with a small lr
+# (a large Adam lr would first kick an already good pose away from the optimum).
+# Adam stages stop a frame early once its loss has not improved by a relative rel_tol
+# for `patience` iterations, or once its gradient norm drops below grad_tol
+# (patience <= 0 / grad_tol <= 0 disable the respective test). Adam overshoots in the
+# first iterations of a stage, so stalls are only counted after an optional "warmup"
+# (default: patience) iterations, and a stopped frame goes back to its best iterate.
+# The L-BFGS tolerances
+# are passed straight to torch.optim.LBFGS. "init" picks the starting pose when no
+# init_params are given: "zero" or "ik" (closed-form estimate from ik_init.py). The IK
+# start is already close to the answer, so its Adam stages are much shorter.
+# Stages missing from a schedule are skipped. The LM schedules replace the first-order
+# stages by batched Levenberg-Marquardt (lm_solver.py) on every frame, which converges
+# in tens of iterations; lm "rel_tol" is the relative cost decrease at which a frame stops.
+# An "lm_refine" stage (same settings as "lm") runs a second LM pass after it.
+# An optional "compile": {"backend": "trace" | "inductor"} entry runs the forward + loss of
+# the Adam and L-BFGS stages compiled (compiled_forward.py); the default is eager.
+# An optional "hands": {"pca_comps": k, "full_from": stage} entry (schedule_with_hand_pca)
+# fits each hand as k coefficients of the model's hand PCA basis instead of 45 axis-angle
+# values, up to the stage full_from (None: all stages); from there on, and in the result,
+# the hands are full 45-D poses again.
+# An optional "loss": {"finger_weight": w} entry overrides FINGER_WEIGHT.
+COLD_SCHEDULE = {
+    "init": {"method": "zero"},
+    "stage1": {"n_iter": 200, "lr": 0.02, "rel_tol": 1e-4, "grad_tol": 1e-8, "patience": 20},
+    "stage2": {"n_iter": 400, "lr": 0.01, "rel_tol": 1e-5, "grad_tol": 1e-8, "patience": 30},
+    "lbfgs": {"max_iter": 50, "tolerance_grad": 1e-7, "tolerance_change": 1e-9},
+}
+IK_SCHEDULE = {
+    "init": {"method": "ik"},
+    "stage1": {"n_iter": 50, "lr": 0.005, "rel_tol": 1e-4, "grad_tol": 1e-8, "patience": 10},
+    "stage2": {"n_iter": 150, "lr": 0.005, "rel_tol": 1e-5, "grad_tol": 1e-8, "patience": 20},
+    "lbfgs": {"max_iter": 50, "tolerance_grad": 1e-7, "tolerance_change": 1e-9},
+}
+WARM_SCHEDULE = {
+    "init": {"method": "zero"},
+    "stage1": {"n_iter": 0, "lr": 0.02, "rel_tol": 1e-4, "grad_tol": 1e-8, "patience": 20},
+    "stage2": {"n_iter": 20, "lr": 0.002, "rel_tol": 1e-5, "grad_tol": 1e-8, "patience": 10},
+    "lbfgs": {"max_iter": 20, "tolerance_grad": 1e-7, "tolerance_change": 1e-9},
+}
+LM_SCHEDULE = {
+    "init": {"method": "ik"},
+    "lm": {"max_iter": 30, "damping": 1e-3, "rel_tol": 1e-6},
+}
+LM_WARM_SCHEDULE = {
+    "init": {"method": "zero"},
+    "lm": {"max_iter": 10, "damping": 1e-3, "rel_tol": 1e-6},
+}
+
+# The pose regularizer of stage 2 (1e-6 * |pose|^2) as LM residuals.
+LM_POSE_REG = 1e-3
+
+# Short full-hand refinement added to LM schedules fitted with PCA hands.
+HAND_REFINE_LM = {"max_iter": 5, "damping": 1e-3, "rel_tol": 1e-6}
+
+# Wall time of a fit is reported per stage; "init" covers the shaped model, the IK start
+# and compilation, "output" the final mesh and residuals.
+TIMED_STAGES = ("init", "stage1", "stage2", "lm", "lm_refine", "lbfgs", "output")
+# Per-frame loss (per_frame_weighted_mse) recorded after each of these; NaN when skipped.
+LOSS_STAGES = ("init", "stage1", "stage2", "lm", "lm_refine", "lbfgs")
+# The final full-vertex forward runs in pieces of this many frames; its intermediates
+# (~1.3 MB per frame) would otherwise scale with the batch (see memory_budget.py).
+OUTPUT_BATCH = 16
+
+
+def schedule_with_tolerances(schedule, rel_tol=None, grad_tol=None, patience=None):
+    """Copy of schedule with the given early-stopping settings applied to every stage."""
+    schedule = {stage: dict(cfg) for stage, cfg in schedule.items()}
+    for stage in ("stage1", "stage2", "lm", "lm_refine"):
+        if stage not in schedule:
+            continue
+        if rel_tol is not None:
+            schedule[stage]["rel_tol"] = rel_tol
+        if stage.startswith("lm"):
+            continue
+        if grad_tol is not None:
+            schedule[stage]["grad_tol"] = grad_tol
+        if patience is not None:
+            schedule[stage]["patience"] = patience
+    if grad_tol is not None and "lbfgs" in schedule:
+        schedule["lbfgs"]["tolerance_grad"] = grad_tol
+    return schedule
+
+
+def schedule_with_hand_pca(schedule, n_comps=12, refine_full=True):
+    """
+    Copy of schedule that fits the hands with n_comps PCA coefficients each. With
+    refine_full the final stage refines the full 45-D hand poses: the L-BFGS stage, or a
+    short "lm_refine" stage (HAND_REFINE_LM) added to LM schedules.
+    """
+    schedule = {stage: dict(cfg) for stage, cfg in schedule.items()}
+    full_from = None
+    if refine_full and "lbfgs" in schedule:
+        full_from = "lbfgs"
+    elif refine_full:
+        schedule["lm_refine"] = dict(HAND_REFINE_LM)
+        full_from = "lm_refine"
+    schedule["hands"] = {"pca_comps": n_comps, "full_from": full_from}
+    return schedule
+
+
+def schedule_with_budget(schedule, max_iter):
+    """Copy of schedule in which no stage runs more than max_iter iterations."""
+    schedule = {stage: dict(cfg) for stage, cfg in schedule.items()}
+    for cfg in schedule.values():
+        for key in ("n_iter", "max_iter"):
+            if key in cfg:
+                cfg[key] = min(cfg[key], max_iter)
+    return schedule
+
+
+def fit_frames_batched(
+    partial_joints_np,
+    smplx_model_path,
+    missing_threshold=1e-6,
+    device=None,
+    init_params=None,
+    schedule=COLD_SCHEDULE,
+    smoothness=None,
+    betas=None,
+):
+    """
+    Fit a chunk of T frames at once. Every parameter is a (T, ...) tensor and each
+    iteration runs a single SMPL-X forward over the whole chunk. The total loss is the
+    sum of per-frame losses, and every stage steps and stops each frame on its own, so
+    frames do not influence each other (except through the smoothness term).
+
+    partial_joints_np: (T, N_joints, 3) numpy array (model joint ordering, e.g. 76)
+    missing_threshold: threshold to treat joint as missing (norm near zero)
+    init_params: optional dict name -> (T, size) array to start from instead of zeros
+    schedule: COLD_SCHEDULE, IK_SCHEDULE, WARM_SCHEDULE, LM_SCHEDULE, LM_WARM_SCHEDULE or a dict
+        with the same layout
+    smoothness: optional {"velocity": w, "acceleration": w} weights of a temporal_smoothness
+        term; the T frames must then be consecutive and are no longer fitted independently
+    betas: optional (n_betas,) body shape shared by all frames and kept fixed (default: mean
+        shape, see shape_estimation.estimate_betas)
+    Returns a dict with "vertices" (T, V, 3), "joints" (T, J_model, 3), "valid_mask" (T, N_joints),
+    "params" (name -> (T, size) array), "residual" (T,) mean residual over valid joints and
+    "iterations" (stage -> (T,) iterations each frame actually used), "timings"
+    (TIMED_STAGES -> (T,) seconds; the wall time of a stage is split evenly over the T frames),
+    "stage_loss" (LOSS_STAGES -> (T,) loss after the stage), "lbfgs_failed" (T,) bool and
+    "residual_min" / "residual_max" (T,) over the valid joints.
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    device = torch.device(device)
+    timings = dict.fromkeys(TIMED_STAGES, 0.0)
+    clock = [time.perf_counter()]
+
+    def lap(stage):
+        # charge the time since the previous lap to stage
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        now = time.perf_counter()
+        timings[stage] += now - clock[0]
+        clock[0] = now
+
+    partial_joints = torch.tensor(partial_joints_np, dtype=torch.float32, device=device)
+    n_frames, n_joints = partial_joints.shape[:2]
+
+    valid_mask = torch.norm(partial_joints, dim=-1) > missing_threshold
+    num_valid = valid_mask.sum(dim=1)
+    print(f"Valid joints per frame: min {num_valid.min().item()}, max {num_valid.max().item()} /{n_joints}")
+
+    # the betas are fixed, so the shape is applied once (shaped_model.py); the loop only
+    # needs the first n_joints joints, the full mesh is decoded once at the end
+    shape = np.zeros(10) if betas is None else np.asarray(betas, dtype=np.float64)
+    shaped = get_shaped_model(smplx_model_path, shape, n_joints, device)
+
+    # Initial parameters (require_grad=True for optimization)
+    if init_params is None and schedule.get("init", {}).get("method") == "ik":
+        evaluator = get_joint_evaluator(get_model(smplx_model_path, device=device), n_joints)
+        init_params = ik_initial_params(partial_joints_np, evaluator, shape, missing_threshold)
+    if init_params is None:
+        params = {
+            name: torch.zeros((n_frames, size), device=device, requires_grad=True)
+            for name, size in POSE_PARAM_SIZES.items()
+        }
+    else:
+        params = {
+            name: torch.tensor(init_params[name], dtype=torch.float32, device=device).requires_grad_(True)
+            for name in POSE_PARAM_SIZES
+        }
+    weights = joint_weights(n_joints, device, schedule.get("loss", {}).get("finger_weight", FINGER_WEIGHT))
+    backend = schedule.get("compile", {}).get("backend", "eager")
+    hands = schedule.get("hands")
+    hand_names = ("left_hand_pose", "right_hand_pose")
+
+    def use_model(model):
+        # fit with model from now on; converts the hand parameters between PCA and full poses
+        nonlocal shaped, joint_loss
+        with torch.no_grad():
+            for side, name in zip(("left", "right"), hand_names):
+                value = params[name].detach()
+                if shaped.use_pca:
+                    value = value @ getattr(shaped, f"{side}_hand_components")
+                if model.use_pca:
+                    value = value @ torch.linalg.pinv(getattr(model, f"{side}_hand_components"))
+                params[name] = value.requires_grad_(True)
+        shaped = model
+        joint_loss = compiled_joint_loss(
+            shaped, weights, backend, smplx_model_path, shape,
+            [params[n].detach() for n in POSE_PARAM_SIZES] + [partial_joints, valid_mask],
+        )
+
+    joint_loss = None
+    full_hands = shaped
+    if hands:
+        use_model(get_shaped_model(smplx_model_path, shape, n_joints, device, use_pca=True,
+                                   num_pca_comps=hands["pca_comps"]))
+    else:
+        use_model(shaped)
+
+    stage_loss = {stage: np.full(n_frames, np.nan) for stage in LOSS_STAGES}
+    lbfgs_failed = np.zeros(n_frames, dtype=bool)
+
+    def record_loss(stage):
+        with torch.no_grad():
+            losses = joint_loss(*(params[n] for n in POSE_PARAM_SIZES), partial_joints, valid_mask)
+        stage_loss[stage] = losses.cpu().numpy()
+
+    def start_stage(stage):
+        if hands and shaped.use_pca and hands.get("full_from") == stage:
+            print(f"Unlocking the full 45-D hand poses for {stage}")
+            use_model(full_hands)
+
+    record_loss("init")
+    lap("init")
+
+    reg_names = ("global_orient", "body_pose", "left_hand_pose", "right_hand_pose")
+    iterations = {}
+
+    def frame_losses(idx=None):
+        # forward only the frames in idx (all frames when None)
+        if idx is None:
+            stage_params, target, valid = params, partial_joints, valid_mask
+        else:
+            stage_params = {n: p[idx] for n, p in params.items()}
+            target, valid = partial_joints[idx], valid_mask[idx]
+        losses = joint_loss(*(stage_params[n] for n in POSE_PARAM_SIZES), target, valid)
+        return losses, stage_params
+
+    def run_adam_stage(stage, opt_names, reg_scale, label, log_every):
+        if stage not in schedule:
+            return
+        start_stage(stage)
+        cfg = schedule[stage]
+        n_iter = cfg["n_iter"]
+        opt_params = [params[n] for n in opt_names]
+        optimizer = torch.optim.Adam(opt_params, lr=cfg["lr"])
+        used = np.full(n_frames, n_iter)
+        warmup = cfg.get("warmup", cfg["patience"])
+        active = torch.ones(n_frames, dtype=torch.bool, device=device)
+        best = torch.full((n_frames,), float("inf"), device=device)
+        stall = torch.zeros(n_frames, dtype=torch.long, device=device)
+        # lowest-loss iterate of every frame; with temporal smoothness the frames are coupled
+        # and the loss does not rank a single frame's iterates, so the last one is kept
+        keep_best = not smoothness
+        best_params = [p.detach().clone() for p in opt_params]
+        for i in range(n_iter):
+            idx = active.nonzero().squeeze(1)
+            optimizer.zero_grad()
+            losses, stage_params = frame_losses(idx)
+            # small regularizer to keep parameters numerically stable (tiny)
+            reg = reg_scale * sum(stage_params[n].pow(2).sum() for n in reg_names if n in opt_names)
+            if smoothness:
+                reg = reg + temporal_smoothness(params, opt_names, smoothness["velocity"], smoothness["acceleration"])
+            (losses.sum() + reg).backward()
+            if (i + 1) % log_every == 0 or i == 0:
+                print(f"[{label}] Iter {i+1}/{n_iter}  mean loss={losses.mean().item():.8f}")
+
+            # per-frame convergence tests, frames that pass are frozen from now on
+            with torch.no_grad():
+                loss_now = losses.detach()
+                improved = loss_now < best[idx] * (1 - cfg["rel_tol"])
+                if i >= warmup:
+                    stall[idx] = torch.where(improved, torch.zeros_like(stall[idx]), stall[idx] + 1)
+                if keep_best:
+                    better = idx[loss_now < best[idx]]
+                    for p, kept in zip(opt_params, best_params):
+                        kept[better] = p[better]
+                best[idx] = torch.minimum(best[idx], loss_now)
+                grad_norm = torch.sqrt(sum(p.grad[idx].pow(2).sum(dim=1) for p in opt_params))
+                done = grad_norm < cfg["grad_tol"]
+                if cfg["patience"] > 0:
+                    done |= stall[idx] >= cfg["patience"]
+                done_idx = idx[done]
+                used[done_idx.cpu().numpy()] = i + 1
+                active[done_idx] = False
+                if keep_best:
+                    for p, kept in zip(opt_params, best_params):
+                        p[done_idx] = kept[done_idx]
+                frozen = ~active
+                snapshot = [p[frozen].clone() for p in opt_params]
+
+            optimizer.step()
+            with torch.no_grad():
+                # Adam momentum would keep moving frozen frames, undo that
+                for p, kept in zip(opt_params, snapshot):
+                    p[frozen] = kept
+            if not active.any():
+                break
+        if keep_best and active.any():
+            # the frames that used the whole budget: is their last step better than their best?
+            with torch.no_grad():
+                idx = active.nonzero().squeeze(1)
+                worse = idx[frame_losses(idx)[0] > best[idx]]
+                for p, kept in zip(opt_params, best_params):
+                    p[worse] = kept[worse]
+        if n_iter:
+            print(f"[{label}] frames converged early: {(used < n_iter).sum()}/{n_frames}, "
+                  f"max iterations used {used.max()}")
+        iterations[stage] = used
+        record_loss(stage)
+        lap(stage)
+
+    # ---------------- Stage 1: Fit body (no hands) ----------------
+    # hand poses keep their initial value here because they are not handed to the optimizer
+    run_adam_stage("stage1", ("global_orient", "body_pose", "transl"), 0.0, "Stage1", 50)
+
+    # ---------------- Stage 2: Fit hands (Adam to get close) ----------------
+    # optimize hands (and allow slight body changes)
+    run_adam_stage("stage2", tuple(params), 1e-6, "Stage2", 100)
+
+    # ---------------- Levenberg-Marquardt (LM schedules) ----------------
+    def run_lm_stage(stage, label):
+        if stage not in schedule:
+            return
+        if smoothness:
+            raise ValueError("The LM solver fits every frame on its own; temporal smoothness needs an Adam schedule")
+        start_stage(stage)
+        cfg = schedule[stage]
+        names = list(POSE_PARAM_SIZES)
+        sizes = [params[n].shape[1] for n in names]
+        n_pose = sum(params[n].shape[1] for n in reg_names)
+        # |residuals|^2 of a frame is its per_frame_weighted_mse loss plus the pose regularizer
+        count = valid_mask.sum(dim=1, keepdim=True).clamp(min=1) * 3
+        scale = torch.sqrt(weights[None] * valid_mask / count)
+
+        def residuals(x, target, frame_scale):
+            diff = (shaped.joints(**dict(zip(names, x.split(sizes, dim=1)))) - target) * frame_scale[..., None]
+            return torch.cat([diff.flatten(1), LM_POSE_REG * x[:, :n_pose]], dim=1)
+
+        def jacobian(x, target, frame_scale):
+            joints, jac = shaped.joints_jacobian(**dict(zip(names, x.split(sizes, dim=1))))
+            r = torch.cat([((joints - target) * frame_scale[..., None]).flatten(1), LM_POSE_REG * x[:, :n_pose]], dim=1)
+            jac = (jac * frame_scale[..., None, None]).flatten(1, 2)
+            reg = LM_POSE_REG * torch.eye(n_pose, x.shape[1], dtype=x.dtype, device=x.device).expand(len(x), -1, -1)
+            return r, torch.cat([jac, reg], dim=1)
+
+        x0 = torch.cat([params[n].detach() for n in names], dim=1)
+        x, _, iterations[stage] = solve_lm(
+            residuals, x0, (partial_joints, scale), jacobian,
+            max_iter=cfg["max_iter"], damping=cfg["damping"], rel_tol=cfg["rel_tol"], label=label,
+        )
+        with torch.no_grad():
+            for name, value in zip(names, x.split(sizes, dim=1)):
+                params[name].copy_(value)
+        record_loss(stage)
+        lap(stage)
+
+    run_lm_stage("lm", "LM")
+    # short second pass, e.g. on the full hand poses after a PCA hand fit
+    run_lm_stage("lm_refine", "LM refine")
+
+    # ---------------- Final refinement: L-BFGS (fine convergence) ----------------
+    # Every frame runs its own L-BFGS (lbfgs_solver.py), so its result does not depend on
+    # the batch. Temporal smoothness couples the frames of a window; there the window is
+    # refined as one problem with torch.optim.LBFGS.
+    lbfgs_cfg = schedule.get("lbfgs", {"max_iter": 0})
+    if "lbfgs" in schedule:
+        start_stage("lbfgs")
+        iterations["lbfgs"] = np.zeros(n_frames, dtype=int)
+    if lbfgs_cfg["max_iter"] > 0 and not smoothness:
+        names = list(POSE_PARAM_SIZES)
+        sizes = [params[n].shape[1] for n in names]
+
+        def objective(x, target, valid):
+            parts = dict(zip(names, x.split(sizes, dim=1)))
+            reg = 1e-8 * sum(parts[n].pow(2).sum(dim=1) for n in reg_names)
+            return joint_loss(*(parts[n] for n in names), target, valid) + reg
+
+        x0 = torch.cat([params[n].detach() for n in names], dim=1)
+        x, _, iterations["lbfgs"], lbfgs_failed[:] = solve_lbfgs(
+            objective, x0, (partial_joints, valid_mask), max_iter=lbfgs_cfg["max_iter"],
+            tolerance_grad=lbfgs_cfg["tolerance_grad"], tolerance_change=lbfgs_cfg["tolerance_change"],
+        )
+        with torch.no_grad():
+            for name, value in zip(names, x.split(sizes, dim=1)):
+                params[name].copy_(value)
+        record_loss("lbfgs")
+        lap("lbfgs")
+    elif lbfgs_cfg["max_iter"] > 0:
+        optimizer_refine = torch.optim.LBFGS(
+            list(params.values()),
+            max_iter=lbfgs_cfg["max_iter"],
+            tolerance_grad=lbfgs_cfg["tolerance_grad"],
+            tolerance_change=lbfgs_cfg["tolerance_change"],
+            line_search_fn="strong_wolfe",
+            lr=1.0,
+        )
+
+        print("Starting L-BFGS refinement (this may take a little while)...")
+
+        def closure():
+            optimizer_refine.zero_grad()
+            losses, _ = frame_losses()
+            total = losses.sum() + 1e-8 * sum(params[n].pow(2).sum() for n in reg_names)
+            if smoothness:
+                total = total + temporal_smoothness(params, params, smoothness["velocity"], smoothness["acceleration"])
+            total.backward()
+            return total
+
+        try:
+            optimizer_refine.step(closure)
+        except Exception as e:
+            print("LBFGS failed or terminated early:", e)
+            lbfgs_failed[:] = True
+        # the window is one L-BFGS problem, so all its frames report the same count
+        iterations["lbfgs"][:] = optimizer_refine.state[optimizer_refine._params[0]].get("n_iter", 0)
+        record_loss("lbfgs")
+        lap("lbfgs")
+
+    # Final output
+    if shaped is not full_hands:
+        use_model(full_hands)
+    output = _evaluate(shaped, params, partial_joints, valid_mask)
+    for t in np.nonzero(output["valid_mask"].any(axis=1))[0]:
+        print("Frame {} residual (valid joints): min {:.6f}, mean {:.6f}, max {:.6f}".format(
+            t, output["residual_min"][t], output["residual"][t], output["residual_max"][t]))
+    lap("output")
+
+    return {
+        **output,
+        "iterations": iterations,
+        "timings": {stage: np.full(n_frames, seconds / n_frames) for stage, seconds in timings.items()},
+        "stage_loss": stage_loss,
+        "lbfgs_failed": lbfgs_failed,
+    }
+
+
+def _evaluate(shaped, params, partial_joints, valid_mask):
+    """Mesh, joints and residual statistics over the valid joints for tensor params."""
+    n_frames = valid_mask.shape[0]
+    vertices, joints = [], []
+    with torch.no_grad():
+        for start in range(0, n_frames, OUTPUT_BATCH):
+            v, j = shaped(**{name: p[start:start + OUTPUT_BATCH] for name, p in params.items()})
+            vertices.append(v.cpu().numpy())
+            joints.append(j.cpu().numpy())
+    vertices = np.concatenate(vertices)
+    joints = np.concatenate(joints)
+    valid = valid_mask.cpu().numpy()
+    residual = np.linalg.norm(joints[:, :valid.shape[1]] - partial_joints.cpu().numpy(), axis=-1)
+    count = valid.sum(axis=1)
+    observed = count > 0  # frames without valid joints report 0
+    return {
+        "vertices": vertices,
+        "joints": joints,
+        "valid_mask": valid,
+        "params": {name: p.detach().cpu().numpy() for name, p in params.items()},
+        "residual": np.where(observed, (residual * valid).sum(axis=1) / np.maximum(count, 1), 0.0),
+        "residual_min": np.where(observed, np.where(valid, residual, np.inf).min(axis=1), 0.0),
+        "residual_max": np.where(observed, np.where(valid, residual, -np.inf).max(axis=1), 0.0),
+    }
+
+
+def evaluate_params(partial_joints_np, smplx_model_path, params, missing_threshold=1e-6, device=None, betas=None):
+    """
+    Mesh, joints and residuals of given parameters (name -> (T, size) arrays, full hand
+    poses) without fitting: the "vertices", "joints", "valid_mask", "params", "residual",
+    "residual_min" and "residual_max" entries of a fit_frames_batched result.
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    partial_joints = torch.tensor(partial_joints_np, dtype=torch.float32, device=device)
+    valid_mask = torch.norm(partial_joints, dim=-1) > missing_threshold
+    shape = np.zeros(10) if betas is None else np.asarray(betas, dtype=np.float64)
+    shaped = get_shaped_model(smplx_model_path, shape, partial_joints.shape[1], device)
+    tensors = {name: torch.tensor(np.asarray(params[name]), dtype=torch.float32, device=device)
+               for name in POSE_PARAM_SIZES}
+    return _evaluate(shaped, tensors, partial_joints, valid_mask)
+
+
+def fit_frames_chunked(
+    partial_joints_np,
+    smplx_model_path,
+    batch_size=1,
+    missing_threshold=1e-6,
+    device=None,
+    schedule=COLD_SCHEDULE,
+    betas=None,
+):
+    """
+    Independent fitting of a whole sequence in consecutive chunks of batch_size frames.
+    Returns the same dict as fit_frames_batched, covering the whole sequence.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    n_frames = len(partial_joints_np)
+    result = None
+    for start in range(0, n_frames, batch_size):
+        stop = min(start + batch_size, n_frames)
+        print(f"\n=== Processing frames {start+1}-{stop}/{n_frames} ===")
+        fit = fit_frames_batched(
+            partial_joints_np[start:stop], smplx_model_path, missing_threshold, device, schedule=schedule,
+            betas=betas,
+        )
+        if result is None:
+            result = allocate_result(fit, n_frames)
+        scatter_result(result, fit, slice(start, stop))
+    return result
+
+
+def fit_frames_warm_start(
+    partial_joints_np,
+    smplx_model_path,
+    n_lanes=1,
+    extrapolate=True,
+    fallback_ratio=1.5,
+    fallback_min=1e-3,
+    missing_threshold=1e-6,
+    device=None,
+    cold_schedule=COLD_SCHEDULE,
+    warm_schedule=WARM_SCHEDULE,
+    betas=None,
+):
+    """
+    Sequential fitting where every frame is seeded from the previous frame's solution
+    (plus its velocity when extrapolate=True) and refined with warm_schedule.
+
+    To keep the batched engine busy the sequence is cut into n_lanes contiguous lanes that
+    advance in lockstep: step k fits frame k of every lane in one batch. The first frame of
+    each lane is fitted with cold_schedule. A warm frame whose mean residual exceeds
+    max(fallback_ratio * previous frame's residual, fallback_min) is refitted cold.
+    Returns the same dict as fit_frames_batched, covering the whole sequence.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    n_frames = len(partial_joints_np)
+    n_lanes = max(1, min(n_lanes, n_frames))
+    lane_len = -(-n_frames // n_lanes)
+    lane_starts = list(range(0, n_frames, lane_len))
+    lane_ends = [min(start + lane_len, n_frames) for start in lane_starts]
+
+    result = None
+    for step in range(lane_len):
+        lanes = [lane for lane, start in enumerate(lane_starts) if start + step < lane_ends[lane]]
+        frames = [lane_starts[lane] + step for lane in lanes]
+        print(f"\n=== Warm-start step {step+1}/{lane_len}: frames {[f + 1 for f in frames]} ===")
+
+        if step == 0:
+            fit = fit_frames_batched(
+                partial_joints_np[frames], smplx_model_path, missing_threshold, device, schedule=cold_schedule,
+                betas=betas,
+            )
+        else:
+            init = {}
+            for name, p in result["params"].items():
+                prev = p[[f - 1 for f in frames]]
+                if extrapolate and step > 1:
+                    prev = prev + (prev - p[[f - 2 for f in frames]])
+                init[name] = prev
+            fit = fit_frames_batched(
+                partial_joints_np[frames], smplx_model_path, missing_threshold, device,
+                init_params=init, schedule=warm_schedule, betas=betas,
+            )
+            reference = result["residual"][[f - 1 for f in frames]]
+            bad = np.nonzero(fit["residual"] > np.maximum(fallback_ratio * reference, fallback_min))[0]
+            if len(bad):
+                print(f"Warm start residual too high for frames {[frames[b] + 1 for b in bad]}, refitting cold")
+                cold = fit_frames_batched(
+                    partial_joints_np[[frames[b] for b in bad]], smplx_model_path, missing_threshold, device,
+                    schedule=cold_schedule, betas=betas,
+                )
+                scatter_result(fit, cold, bad)
+
+        if result is None:
+            result = allocate_result(fit, n_frames)
+        scatter_result(result, fit, frames)
+
+    return result
+
+
+def fit_frames_windowed(
+    partial_joints_np,
+    smplx_model_path,
+    window=32,
+    overlap=8,
+    velocity_weight=0.0,
+    acceleration_weight=1e-2,
+    missing_threshold=1e-6,
+    device=None,
+    schedule=COLD_SCHEDULE,
+    betas=None,
+):
+    """
+    Temporal fitting: windows of `window` consecutive frames are fitted jointly with a
+    velocity/acceleration penalty on the pose parameters, so the output is smooth without
+    any post-hoc filtering. Windows slide with `overlap` frames; the overlapping frames are
+    initialised from the previous window and the cut between two windows is placed in the
+    middle of the overlap. Frames after the overlap start from the last solved frame.
+    Returns the same dict as fit_frames_batched, covering the whole sequence.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    n_frames = len(partial_joints_np)
+    window = max(1, min(window, n_frames))
+    overlap = max(0, min(overlap, window - 1))
+    stride = window - overlap
+    smoothness = {"velocity": velocity_weight, "acceleration": acceleration_weight}
+
+    result = None
+    committed = 0  # frames [0, committed) are final
+    start = 0
+    while committed < n_frames:
+        stop = min(start + window, n_frames)
+        last = stop == n_frames
+        print(f"\n=== Window frames {start+1}-{stop}/{n_frames} ===")
+
+        init = None
+        if result is not None:
+            # overlap from the previous window, the rest from the last solved frame
+            solved_until = start + overlap
+            init = {}
+            for name, p in result["params"].items():
+                known = p[start:solved_until]
+                filler = np.repeat(p[solved_until - 1:solved_until], stop - solved_until, axis=0)
+                init[name] = np.concatenate([known, filler])
+        fit = fit_frames_batched(
+            partial_joints_np[start:stop], smplx_model_path, missing_threshold, device,
+            init_params=init, schedule=schedule, smoothness=smoothness, betas=betas,
+        )
+        if result is None:
+            result = allocate_result(fit, n_frames)
+
+        cut = n_frames if last else start + stride + overlap // 2
+        # frames before `committed` keep the previous window's values, except that the
+        # overlap region still has to be stored for initialising the next window
+        keep_from = committed - start
+        scatter_result(result, slice_result(fit, keep_from, cut - start), slice(committed, cut))
+        if not last:
+            scatter_result(result, slice_result(fit, cut - start, stop - start), slice(cut, stop))
+        committed = cut
+        start += stride
+
+    return result
+
+
+def fit_frames_keyframes(
+    partial_joints_np,
+    smplx_model_path,
+    batch_size=1,
+    motion_threshold=0.01,
+    curvature_threshold=0.01,
+    max_gap=10,
+    fallback_ratio=1.5,
+    fallback_min=1e-3,
+    missing_threshold=1e-6,
+    device=None,
+    schedule=COLD_SCHEDULE,
+    betas=None,
+):
+    """
+    Fit only keyframes picked from the input motion (keyframes.select_keyframes) in chunks
+    of batch_size and slerp the parameters of the frames in between. Every interpolated
+    frame is then evaluated once; a frame whose mean residual exceeds
+    max(fallback_ratio * the larger residual of its two keyframes, fallback_min) is fitted
+    with schedule like a keyframe.
+    Returns the same dict as fit_frames_batched, covering the whole sequence, plus
+    "interpolated" (T,) bool for the frames that kept their interpolated parameters.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    n_frames = len(partial_joints_np)
+    keys = select_keyframes(partial_joints_np, missing_threshold, motion_threshold, curvature_threshold, max_gap)
+    between = np.setdiff1d(np.arange(n_frames), keys)
+    print(f"\n=== Keyframes: fitting {len(keys)}/{n_frames} frames, interpolating {len(between)} ===")
+    fit_kwargs = dict(missing_threshold=missing_threshold, device=device, schedule=schedule, betas=betas)
+    key_fit = fit_frames_chunked(partial_joints_np[keys], smplx_model_path, batch_size, **fit_kwargs)
+
+    result = allocate_result(key_fit, n_frames)
+    scatter_result(result, key_fit, keys)
+    result["interpolated"] = np.zeros(n_frames, dtype=bool)
+    if not len(between):
+        return result
+
+    start = time.perf_counter()
+    model = get_model(smplx_model_path, device=torch.device("cpu"))
+    offsets = {"left_hand_pose": model.left_hand_mean.numpy(), "right_hand_pose": model.right_hand_mean.numpy()}
+    params = interpolate_params(keys, key_fit["params"], between, offsets)
+    interpolated = allocate_result(key_fit, len(between))
+    interpolated.update(evaluate_params(partial_joints_np[between], smplx_model_path, params, missing_threshold,
+                                        device, betas))
+    for loss in interpolated["stage_loss"].values():
+        loss[:] = np.nan
+    interpolated["timings"]["output"][:] = (time.perf_counter() - start) / len(between)
+    scatter_result(result, interpolated, between)
+    result["interpolated"][between] = True
+
+    # verification: refit the frames the interpolation does not explain
+    right = np.searchsorted(keys, between)
+    reference = np.maximum(key_fit["residual"][right - 1], key_fit["residual"][right])
+    bad = between[interpolated["residual"] > np.maximum(fallback_ratio * reference, fallback_min)]
+    print(f"Interpolated frames above tolerance: {len(bad)}/{len(between)}")
+    if len(bad):
+        refit = fit_frames_chunked(partial_joints_np[bad], smplx_model_path, batch_size, **fit_kwargs)
+        scatter_result(result, refit, bad)
+        result["interpolated"][bad] = False
+    return result
+
+
+def slice_result(fit, begin, end=None):
+    """fit[...][begin:end] for every (nested) entry of a result dict."""
+    return {key: slice_result(value, begin, end) if isinstance(value, dict) else value[begin:end]
+            for key, value in fit.items()}
+
+
+def concatenate_results(parts):
+    """Result dict of consecutive frame ranges joined along the frame axis."""
+    first = parts[0]
+    return {
+        key: concatenate_results([p[key] for p in parts]) if isinstance(value, dict)
+        else np.concatenate([p[key] for p in parts])
+        for key, value in first.items()
+    }
+
+
+def allocate_result(fit, n_frames):
+    """Empty sequence-level result dict with the per-frame shapes of fit."""
+    def empty(value):
+        if isinstance(value, dict):
+            return {key: empty(v) for key, v in value.items()}
+        return np.zeros((n_frames,) + value.shape[1:], dtype=value.dtype)
+    return empty(fit)
+
+
+def scatter_result(target, source, index):
+    """target[...][index] = source[...] for every (nested) entry of a result dict."""
+    for key, value in source.items():
+        if isinstance(value, dict):
+            scatter_result(target[key], value, index)
+        else:
+            target[key][index] = value
+
+
+def infer_full_mesh_from_partial_joints(
+    partial_joints_np,
+    smplx_model_path,
+    missing_threshold=1e-6,
+    device=None,
+):
+    """
+    partial_joints_np: (N_joints, 3) numpy array (N_joints should match model joint ordering, e.g. 76)
+    missing_threshold: threshold to treat joint as missing (norm near zero)
+    Single-frame wrapper around fit_frames_batched.
+    """
+    fit = fit_frames_batched(np.asarray(partial_joints_np)[None], smplx_model_path, missing_threshold, device)
+    return fit["vertices"][0], fit["joints"][0], fit["valid_mask"][0]
@@ -1,264 +1,16 @@
-import torch
-import smplx
 import numpy as np
 import argparse
 import os
-import numpy as np
+import shutil
+from numpy.lib.format import open_memmap
 from scipy.signal import butter, sosfiltfilt
-
-finger_indices = [
-        25, 26, 27, 67,  # left index
-        28, 29, 30, 68,  # left middle
-        31, 32, 33, 70,  # left pinky
-        34, 35, 36, 69, # left ring
-        37, 38, 39, 66, # left thumb
-        40, 41, 42, 72, # right index
-        43, 44, 45, 73, # right middle
-        46, 47, 48, 75,  # right pinky
-        49, 50, 51, 74, # right ring
-        52, 53, 54, 71, # right thumb
-        20, 21, # both wrists
-        # 18,19 #include elbows
-    ]
-
-
-def infer_full_mesh_from_partial_joints(
-    partial_joints_np,
-    smplx_model_path,
-    missing_threshold=1e-6,
-    device=None,
-):
-    """
-    partial_joints_np: (N_joints, 3) numpy array (N_joints should match model joint ordering, e.g. 76)
-    finger_indices: list/iterable of int indices (indices within the joint array) to upweight
-    missing_threshold: threshold to treat joint as missing (norm near zero)
-    """
-    if device is None:
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    partial_joints = torch.tensor(partial_joints_np, dtype=torch.float32, device=device)
-
-    joint_norms = torch.norm(partial_joints, dim=1)
-    valid_mask = joint_norms > missing_threshold
-    num_valid = valid_mask.sum().item()
-    print(f"Valid joints: {num_valid}/{len(valid_mask)}")
-
-    model = smplx.create(
-        model_path=smplx_model_path,
-        model_type="smplx",
-        gender="male",
-        use_pca=False,
-        num_pca_comps=12,
-        create_global_orient=True,
-        create_body_pose=True,
-        create_betas=True,
-        create_left_hand_pose=True,
-        create_right_hand_pose=True,
-        use_face_contour=False,
-    ).to(device)
-
-    # Initial parameters (require_grad=True for optimization)
-    global_orient = torch.zeros((1, 3), device=device, requires_grad=True)
-    body_pose = torch.zeros((1, 63), device=device, requires_grad=True)
-    betas = torch.zeros((1, 10), device=device, requires_grad=False)
-    left_hand_pose = torch.zeros((1, 45), device=device, requires_grad=True)
-    right_hand_pose = torch.zeros((1, 45), device=device, requires_grad=True)
-    transl = torch.zeros((1, 3), device=device, requires_grad=True)
-
-
-    # create weight vector and ensure device type
-    weights = torch.ones(len(valid_mask), device=device)
-    for idx in finger_indices:
-        if 0 <= idx < len(weights):
-            weights[idx] = 5.0  # upweight fingers (tune this if needed)
-
-    # helper: compute weighted MSE only over valid joints
-    def weighted_mse_loss(pred_joints, target_joints, valid_mask, weights):
-        # pred_joints: (num_joints, 3)
-        # weights: (num_joints,)
-        diff = (pred_joints - target_joints) ** 2  # (J, 3)
-        weighted = diff * weights.unsqueeze(1)  # (J, 3)
-        # select valid rows and average over elements
-        valid_rows = weighted[valid_mask]
-        if valid_rows.numel() == 0:
-            return torch.tensor(0.0, device=device, requires_grad=True)
-        return valid_rows.mean()
-
-    # ---------------- Stage 1: Fit body (no hands) ----------------
-    optimizer_stage1 = torch.optim.Adam(
-        [global_orient, body_pose, transl], lr=0.02
-    )
-    n_iter_stage1 = 200
-    for i in range(n_iter_stage1):
-        optimizer_stage1.zero_grad()
-        output = model(
-            global_orient=global_orient,
-            body_pose=body_pose,
-            betas=betas,
-            transl=transl,
-        )
-        predicted_joints = output.joints[0, : partial_joints.shape[0]]  # (J,3)
-        loss = weighted_mse_loss(predicted_joints, partial_joints, valid_mask, weights)
-        loss.backward()
-        optimizer_stage1.step()
-        if (i + 1) % 50 == 0 or i == 0:
-            print(f"[Stage1] Iter {i+1}/{n_iter_stage1}  loss={loss.item():.8f}")
-
-    # ---------------- Stage 2: Fit hands (Adam to get close) ----------------
-    # optimize hands (and allow slight body changes)
-    params_stage2 = [
-        global_orient,
-        body_pose,
-        transl,
-        left_hand_pose,
-        right_hand_pose,
-    ]
-    optimizer_stage2 = torch.optim.Adam(params_stage2, lr=0.01)
-    n_iter_stage2 = 400
-    for i in range(n_iter_stage2):
-        optimizer_stage2.zero_grad()
-        output = model(
-            global_orient=global_orient,
-            body_pose=body_pose,
-            betas=betas,
-            left_hand_pose=left_hand_pose,
-            right_hand_pose=right_hand_pose,
-            transl=transl,
-        )
-        predicted_joints = output.joints[0, : partial_joints.shape[0]]
-        loss = weighted_mse_loss(predicted_joints, partial_joints, valid_mask, weights)
-        # small regularizer to keep parameters numerically stable (tiny)
-        reg = 1e-6 * (
-            global_orient.pow(2).sum()
-            + body_pose.pow(2).sum()
-            + left_hand_pose.pow(2).sum()
-            + right_hand_pose.pow(2).sum()
-            #+ betas.pow(2).sum()
-        )
-        (loss + reg).backward()
-        optimizer_stage2.step()
-        if (i + 1) % 100 == 0 or i == 0:
-            print(f"[Stage2] Iter {i+1}/{n_iter_stage2}  loss={loss.item():.8f}")
-
-    # ---------------- Final refinement: L-BFGS (fine convergence) ----------------
-    # LBFGS works better when parameters are small in number; we include all pose params here.
-    # Note: LBFGS needs a closure that recomputes loss and gradients.
-    params_refine = [global_orient, body_pose, transl, left_hand_pose, right_hand_pose]
-    # Make sure all require grad
-    for p in params_refine:
-        p.requires_grad = True
-
-    # LBFGS optimizer
-    optimizer_refine = torch.optim.LBFGS(params_refine, max_iter=50, line_search_fn="strong_wolfe", lr=1.0)
-
-    print("Starting L-BFGS refinement (this may take a little while)...")
-
-    def closure():
-        optimizer_refine.zero_grad()
-        output = model(
-            global_orient=global_orient,
-            body_pose=body_pose,
-            betas=betas,
-            left_hand_pose=left_hand_pose,
-            right_hand_pose=right_hand_pose,
-            transl=transl,
-        )
-        predicted_joints = output.joints[0, : partial_joints.shape[0]]
-        loss = weighted_mse_loss(predicted_joints, partial_joints, valid_mask, weights)
-        # very tiny regularizer to stabilize
-        reg = 1e-8 * (
-            global_orient.pow(2).sum()
-            + body_pose.pow(2).sum()
-            + left_hand_pose.pow(2).sum()
-            + right_hand_pose.pow(2).sum()
-            #+ betas.pow(2).sum()
-        )
-        (loss + reg).backward()
-        return loss + reg
-
-    try:
-        optimizer_refine.step(closure)
-    except Exception as e:
-        print("LBFGS failed or terminated early:", e)
-
-    # Final output
-    final_output = model(
-        global_orient=global_orient,
-        body_pose=body_pose,
-        betas=betas,
-        left_hand_pose=left_hand_pose,
-        right_hand_pose=right_hand_pose,
-        transl=transl,
-    )
-    mesh = final_output.vertices[0].detach().cpu().numpy()
-    joints = final_output.joints[0].detach().cpu().numpy()
-
-    # final residual on valid joints
-    final_pred = joints[: partial_joints.shape[0]]
-    residual = np.linalg.norm(final_pred[valid_mask.cpu().numpy()] - partial_joints.cpu().numpy()[valid_mask.cpu().numpy()], axis=1)
-    print("Final per-joint residual (valid joints): min {:.6f}, mean {:.6f}, max {:.6f}".format(residual.min(), residual.mean(), residual.max()))
-
-    return mesh, joints, valid_mask.cpu().numpy()
-
-
-
-# ─── Arguments ────────────────────────────────────────────────────────────────
-parser = argparse.ArgumentParser(description="Fit SMPL-X meshes from partial joints")
-parser.add_argument(
-    "--joints",
-    type=str,
-    default="data/smplx_joints.npy",   # default file
-    help="Path to .npy file containing partial joints (default: smplx_joints.npy)"
-)
-parser.add_argument(
-    "--model",
-    type=str,
-    default="models",   # default folder
-    help="Path to SMPL-X model folder (default: ./models)"
-)
-parser.add_argument(
-    "--out_meshes",
-    type=str,
-    default="data/all_meshes.npy",
-    help="Output .npy file for meshes (default: all_meshes.npy)"
-)
-parser.add_argument(
-    "--out_joints",
-    type=str,
-    default="data/all_joints.npy",
-    help="Output .npy file for joints (default: all_joints.npy)"
-)
-args = parser.parse_args()
- 
-# ─── Load Input ───────────────────────────────────────────────────────────────
-if not os.path.exists(args.joints):
-    raise FileNotFoundError(f"Joints file not found: {args.joints}")
-if not os.path.exists(args.model):
-    raise FileNotFoundError(f"Model path not found: {args.model}")
-
-partial_joints = np.load(args.joints)
-
-print(f"Loaded joints from {args.joints}, shape = {partial_joints.shape}")
-
-print(args.joints, args.model)
-# ─── Processing ───────────────────────────────────────────────────────────────
-all_meshes, all_joints = [], []
-
-for i in range(len(partial_joints)):
-    print(f"\n=== Processing frame {i+1}/{len(partial_joints)} ===")
-    mesh, joints, valid_joints_mask = infer_full_mesh_from_partial_joints(partial_joints[i], args.model)
-    all_meshes.append(mesh)
-    all_joints.append(joints)
-
-all_meshes = np.stack(all_meshes)
-all_joints = np.stack(all_joints)
-
-# ─── Save Outputs ─────────────────────────────────────────────────────────────
-np.save(args.out_meshes, all_meshes)
-np.save(args.out_joints, all_joints)
-
-print(f"\n Saved {len(all_meshes)} meshes → {args.out_meshes}")
-print(f"Saved {len(all_joints)} joints → {args.out_joints}")
+from output_writer import OutputWriter
+from telemetry import TelemetryWriter
+from result_cache import ResultCache
+from model_cache import get_model
+from memory_budget import batch_size_for_budget
+from compiled_forward import BACKENDS
+from pipeline import build_schedules, fit_chunks, take_betas
 
 # ─── Smooth Outputs with Low-pass-filter─────────────────────────────────────────────────────────────
 fps = 30.0                      # your sequence is 30 fps
@@ -280,14 +32,390 @@ def smooth_time(data_TxNx3, cutoff_hz):
     flat_sm = sosfiltfilt(sos, flat, axis=0)
     return flat_sm.reshape(T, N, C)
 
+def smooth_time_file(in_path, out_path, cutoff_hz, block_bytes=64 * 2**20):
+    """
+    smooth_time for a (T, N, 3) .npy file, written to another .npy file. The input is
+    memory-mapped and filtered a block of channels at a time, so only block_bytes of
+    float64 work memory are needed however long the sequence is.
+    """
+    data = np.load(in_path, mmap_mode="r")
+    T, N, C = data.shape
+    flat = data.reshape(T, N * C)
+    out = open_memmap(out_path, mode="w+", dtype=data.dtype, shape=data.shape)
+    out_flat = out.reshape(T, N * C)
+    sos = lowpass_sos(cutoff_hz, fps, order)
+    block = max(1, block_bytes // (8 * T))
+    for col in range(0, N * C, block):
+        out_flat[:, col:col + block] = sosfiltfilt(sos, flat[:, col:col + block], axis=0)
+    out.flush()
+
+
+def main():
+    # ─── Arguments ────────────────────────────────────────────────────────────────
+    parser = argparse.ArgumentParser(description="Fit SMPL-X meshes from partial joints")
+    parser.add_argument(
+        "--joints",
+        type=str,
+        default="data/smplx_joints.npy",   # default file
+        help="Path to .npy file containing partial joints (default: smplx_joints.npy)"
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="models",   # default folder
+        help="Path to SMPL-X model folder (default: ./models)"
+    )
+    parser.add_argument(
+        "--out_meshes",
+        type=str,
+        default="data/all_meshes.npy",
+        help="Output .npy file for meshes (default: all_meshes.npy)"
+    )
+    parser.add_argument(
+        "--out_joints",
+        type=str,
+        default="data/all_joints.npy",
+        help="Output .npy file for joints (default: all_joints.npy)"
+    )
+    parser.add_argument(
+        "--out_params",
+        type=str,
+        default="data/all_params.npz",
+        help="Output .npz file for the fitted SMPL-X parameters (default: all_params.npz)"
+    )
+    parser.add_argument(
+        "--no_meshes",
+        action="store_true",
+        help="Only store parameters and joints; decode meshes later with decode_params.py"
+    )
+    parser.add_argument(
+        "--telemetry",
+        type=str,
+        default=None,
+        help="Write one JSON record per frame (stage times, iterations, losses, residuals) to this .jsonl file"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Cache fitted parameters per frame in this directory and only fit frames that are not cached yet. "
+             "The betas of every joints file are kept there too and reused while new estimates stay within "
+             "0.05; both count towards --cache_max_mb"
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=float,
+        default=1024,
+        help="Size limit of --cache_dir; least recently used frames are evicted beyond it (default: 1024)"
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=1,
+        help="Number of frames optimized together in one batched fit (default: 1)"
+    )
+    parser.add_argument(
+        "--memory_budget",
+        type=float,
+        default=None,
+        help="Total memory in GB the fit may use (all workers together); sets --batch_size to the largest "
+             "batch that fits and shortens --chunk_size if needed (default: use --batch_size as given)"
+    )
+    parser.add_argument(
+        "--warm_start",
+        action="store_true",
+        help="Seed every frame from the previous frame's solution and refine it briefly. "
+             "--batch_size then sets the number of sequence lanes fitted in parallel"
+    )
+    parser.add_argument(
+        "--no_extrapolate",
+        action="store_true",
+        help="With --warm_start, copy the previous solution instead of extrapolating its velocity"
+    )
+    parser.add_argument(
+        "--warm_fallback",
+        type=float,
+        default=1.5,
+        help="With --warm_start, refit a frame cold when its residual exceeds this factor "
+             "times the previous frame's residual (default: 1.5)"
+    )
+    parser.add_argument(
+        "--temporal_window",
+        type=int,
+        default=0,
+        help="Fit windows of this many consecutive frames jointly with a temporal smoothness term "
+             "instead of smoothing the outputs afterwards (default: 0 = off)"
+    )
+    parser.add_argument(
+        "--temporal_overlap",
+        type=int,
+        default=8,
+        help="Frames shared by consecutive windows of --temporal_window (default: 8)"
+    )
+    parser.add_argument(
+        "--velocity_weight",
+        type=float,
+        default=0.0,
+        help="Weight of the parameter velocity penalty with --temporal_window (default: 0)"
+    )
+    parser.add_argument(
+        "--accel_weight",
+        type=float,
+        default=1e-2,
+        help="Weight of the parameter acceleration penalty with --temporal_window (default: 1e-2)"
+    )
+    parser.add_argument(
+        "--keyframes",
+        action="store_true",
+        help="Fit only keyframes picked from the joint motion and slerp the frames in between; "
+             "interpolated frames that miss their targets are fitted too"
+    )
+    parser.add_argument(
+        "--key_motion",
+        type=float,
+        default=0.01,
+        help="New keyframe once the joints moved this far (mean, metres) since the last one (default: 0.01)"
+    )
+    parser.add_argument(
+        "--key_curvature",
+        type=float,
+        default=0.01,
+        help="New keyframe where the joints accelerate by more than this (mean, metres/frame^2) (default: 0.01)"
+    )
+    parser.add_argument(
+        "--key_max_gap",
+        type=int,
+        default=10,
+        help="At most this many frames between keyframes (default: 10)"
+    )
+    parser.add_argument(
+        "--key_fallback",
+        type=float,
+        default=1.5,
+        help="Fit an interpolated frame when its residual exceeds this factor times its keyframes' (default: 1.5)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Fit contiguous shards of the sequence in this many processes (default: 1)"
+    )
+    parser.add_argument(
+        "--threads_per_worker",
+        type=int,
+        default=None,
+        help="PyTorch threads per worker process (default: CPU cores / workers)"
+    )
+    parser.add_argument(
+        "--shard_overlap",
+        type=int,
+        default=8,
+        help="Frames before each shard / checkpoint chunk that are fitted first to warm up, "
+             "then discarded (default: 8)"
+    )
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=None,
+        help="Write every finished chunk of frames to this folder (default: no checkpoints)"
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=100,
+        help="Frames fitted and written to the outputs at a time (per worker with --workers), also the "
+             "checkpoint granularity (default: 100)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Load the chunks already in --checkpoint_dir and only fit the missing ones"
+    )
+    parser.add_argument(
+        "--zero_betas",
+        action="store_true",
+        help="Fit with the mean body shape instead of estimating the betas from the bone lengths"
+    )
+    parser.add_argument(
+        "--solver",
+        choices=["adam", "lm"],
+        default="adam",
+        help="adam: Adam stages + L-BFGS; lm: batched Levenberg-Marquardt from the IK estimate "
+             "(per-frame fits only, not with --temporal_window) (default: adam)"
+    )
+    parser.add_argument(
+        "--ik_init",
+        action="store_true",
+        help="Start cold fits from an analytic IK estimate instead of the zero pose (shorter schedule)"
+    )
+    parser.add_argument(
+        "--hand_pca",
+        type=int,
+        default=0,
+        help="Fit each hand with this many PCA coefficients instead of 45 axis-angle values "
+             "(default: 0, full hand poses)"
+    )
+    parser.add_argument(
+        "--no_full_hand_refine",
+        action="store_true",
+        help="With --hand_pca, keep the hands in PCA space for the final refinement too "
+             "(default: the final L-BFGS refines the full 45-D hand poses)"
+    )
+    parser.add_argument(
+        "--compile",
+        choices=BACKENDS,
+        default="eager",
+        help="Run the forward + loss of the Adam / L-BFGS stages traced to TorchScript (trace) or "
+             "through torch.compile (inductor); the compiled artifacts are cached next to the model "
+             "and eager is used when compilation fails (default: eager)"
+    )
+    parser.add_argument(
+        "--rel_tol",
+        type=float,
+        default=None,
+        help="Stop a frame's Adam stage when its loss improves by less than this relative amount "
+             "for --patience iterations (default: per-stage values in fitting.py)"
+    )
+    parser.add_argument(
+        "--grad_tol",
+        type=float,
+        default=None,
+        help="Stop a frame's stage when its gradient norm drops below this value "
+             "(default: per-stage values in fitting.py)"
+    )
+    parser.add_argument(
+        "--patience",
+        type=int,
+        default=None,
+        help="Iterations without relative improvement before a frame stops (default: per-stage values)"
+    )
+    parser.add_argument(
+        "--no_early_stop",
+        action="store_true",
+        help="Always run the full iteration budget of every stage"
+    )
+    args = parser.parse_args()
+
+    if not 0 <= args.hand_pca <= 45:
+        parser.error("--hand_pca must be between 0 and 45")
+    if args.no_early_stop:
+        args.rel_tol, args.grad_tol, args.patience = 0.0, 0.0, 0
+    if args.warm_start and args.temporal_window > 0:
+        parser.error("--warm_start cannot be combined with --temporal_window")
+    if args.keyframes and (args.warm_start or args.temporal_window > 0):
+        parser.error("--keyframes cannot be combined with --warm_start or --temporal_window")
+    if args.cache_dir and (args.warm_start or args.temporal_window > 0 or args.keyframes):
+        parser.error("--cache_dir only caches independent per-frame fits, not --warm_start, "
+                     "--temporal_window or --keyframes")
+    if args.memory_budget and args.temporal_window > 0:
+        parser.error("--memory_budget sizes --batch_size, which --temporal_window does not use")
+    if args.solver == "lm" and args.temporal_window > 0:
+        parser.error("--solver lm fits frames independently and cannot be combined with --temporal_window")
+    cold_schedule, warm_schedule = build_schedules(
+        args.solver, args.ik_init, args.rel_tol, args.grad_tol, args.patience,
+        args.hand_pca, not args.no_full_hand_refine, args.compile,
+    )
 
-# ---- smooth ----
-meshes_sm = smooth_time(all_meshes, cutoff_hz_mesh)
-joints_sm = smooth_time(all_joints, cutoff_hz_joints)
-
-# ---- save ----
-folder_m, fname_m = os.path.split(args.out_meshes)
-np.save(os.path.join(folder_m, f"smoothed_{fname_m}"), meshes_sm)
-
-folder_j, fname_j = os.path.split(args.out_joints)
-np.save(os.path.join(folder_j, f"smoothed_{fname_j}"), joints_sm)
+    # ─── Load Input ───────────────────────────────────────────────────────────────
+    if not os.path.exists(args.joints):
+        raise FileNotFoundError(f"Joints file not found: {args.joints}")
+    if not os.path.exists(args.model):
+        raise FileNotFoundError(f"Model path not found: {args.model}")
+
+    partial_joints = np.load(args.joints)
+
+    print(f"Loaded joints from {args.joints}, shape = {partial_joints.shape}")
+
+    print(args.joints, args.model)
+    # ─── Body shape, estimated once for the whole take ────────────────────────────
+    if args.zero_betas:
+        betas = np.zeros(10)
+    else:
+        betas = take_betas(partial_joints, args.model)
+    cache = ResultCache(args.cache_dir, int(args.cache_max_mb * 2**20)) if args.cache_dir else None
+    if cache is not None:
+        # reuse the betas of an earlier run, so a few edited frames keep the other frames' keys
+        betas = cache.stable_betas(betas, os.path.abspath(args.joints), args.model)
+    print(f"Betas: {np.round(betas, 3)}")
+
+    # ─── Processing ───────────────────────────────────────────────────────────────
+    if args.temporal_window > 0:
+        mode, options = "windowed", dict(
+            window=args.temporal_window, overlap=args.temporal_overlap,
+            velocity_weight=args.velocity_weight, acceleration_weight=args.accel_weight,
+        )
+    elif args.warm_start:
+        mode, options = "warm_start", dict(extrapolate=not args.no_extrapolate, fallback_ratio=args.warm_fallback)
+    elif args.keyframes:
+        mode, options = "keyframes", dict(
+            motion_threshold=args.key_motion, curvature_threshold=args.key_curvature,
+            max_gap=args.key_max_gap, fallback_ratio=args.key_fallback,
+        )
+    else:
+        mode, options = "frames", {}
+    if args.memory_budget:
+        # warm-start fits run both schedules
+        schedule = {**warm_schedule, **cold_schedule} if mode == "warm_start" else cold_schedule
+        try:
+            args.batch_size, args.chunk_size = batch_size_for_budget(
+                args.memory_budget * 2**30, schedule, get_model(args.model).v_template.shape[0],
+                partial_joints.shape[1], args.chunk_size, args.workers,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Memory budget {args.memory_budget:g} GB: batch size {args.batch_size}, chunk size {args.chunk_size}")
+
+    # ─── Fit chunk by chunk, straight into the output memmaps ─────────────────────
+    writer = OutputWriter(None if args.no_meshes else args.out_meshes, args.out_joints, len(partial_joints))
+    telemetry = TelemetryWriter(args.telemetry) if args.telemetry else None
+
+    def on_chunk(start, fit):
+        writer.write(start, fit)
+        if telemetry is not None:
+            telemetry.write(start, fit)
+    for start, fit in fit_chunks(
+        partial_joints, args.model, mode, schedule=cold_schedule, warm_schedule=warm_schedule, betas=betas,
+        batch_size=args.batch_size, chunk_size=args.chunk_size, workers=args.workers,
+        threads_per_worker=args.threads_per_worker, shard_overlap=args.shard_overlap, cache=cache,
+        checkpoint_dir=args.checkpoint_dir, resume=args.resume, take=os.path.abspath(args.joints), **options,
+    ):
+        on_chunk(start, fit)
+    writer.close()
+    if args.telemetry:
+        telemetry.close()
+        print(f"Saved per-frame telemetry → {args.telemetry}")
+    if args.cache_dir:
+        print(f"Result cache: {cache.hits} frames reused, {cache.misses} fitted, "
+              f"{cache.evict()} evicted → {args.cache_dir}")
+    writer.save_params(args.out_params, betas=betas, gender="male", use_pca=False, flat_hand_mean=False)
+
+    print("\nIterations used per frame: " + ", ".join(
+        f"{stage} mean {used.mean():.1f} (min {used.min()}, max {used.max()})" for stage, used in writer.iterations.items()
+    ))
+    print("Time per stage: " + ", ".join(
+        f"{stage} {seconds.sum():.2f}s ({1000 * seconds.mean():.1f} ms/frame)"
+        for stage, seconds in writer.timings.items() if seconds.any()
+    ))
+    print(f"\n Saved {len(partial_joints)} parameter sets → {args.out_params}")
+    if not args.no_meshes:
+        print(f"Saved {len(partial_joints)} meshes → {args.out_meshes}")
+    print(f"Saved {len(partial_joints)} joints → {args.out_joints}")
+
+    # ---- smooth ----
+    folder_m, fname_m = os.path.split(args.out_meshes)
+    folder_j, fname_j = os.path.split(args.out_joints)
+    smoothed_meshes = os.path.join(folder_m, f"smoothed_{fname_m}")
+    smoothed_joints = os.path.join(folder_j, f"smoothed_{fname_j}")
+    if args.temporal_window > 0:
+        # the windowed solver is already smooth in parameter space, no vertex filtering needed
+        if not args.no_meshes:
+            shutil.copyfile(args.out_meshes, smoothed_meshes)
+        shutil.copyfile(args.out_joints, smoothed_joints)
+    else:
+        if not args.no_meshes:
+            smooth_time_file(args.out_meshes, smoothed_meshes, cutoff_hz_mesh)
+        smooth_time_file(args.out_joints, smoothed_joints, cutoff_hz_joints)
+
+
+if __name__ == "__main__":
+    main()
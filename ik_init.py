@@ -0,0 +1,175 @@
+import numpy as np
+from scipy.spatial.transform import Rotation
+from joint_forward import NUM_KINEMATIC_JOINTS
+
+# ─── Analytic inverse-kinematics initializer ──────────────────────────────────
+# Closed-form starting point for the gradient stages instead of the zero pose:
+#   1. root orientation + translation by Procrustes alignment of the rest-pose
+#      pelvis/hips/shoulders/neck onto their targets,
+#   2. walking the SMPL-X kinematic tree (parents before children, including the
+#      finger chains) and rotating every joint so that its rest-pose bones point at
+#      the targets of its nearest observed descendants.
+# A joint whose descendants are observed further down the chain (e.g. spine1-3 when
+# only the neck is tracked) takes an equal share of the rotation, so the bend is
+# spread along the chain. Joints without observed descendants keep the model's mean
+# pose (parameter 0).
+
+ROOT_ALIGN_JOINTS = [0, 1, 2, 16, 17, 12]  # pelvis, hips, shoulders, neck
+
+
+def _rest_skeleton(evaluator, betas):
+    """Rest positions of the evaluator's n_joints joints for betas and the parent of every joint."""
+    template, shapedirs, parents = (t.double().cpu().numpy() for t in evaluator.rest_basis())
+    betas = np.asarray(betas, dtype=np.float64)[: evaluator.n_betas]
+    return template + np.einsum("l,jcl->jc", betas, shapedirs), parents.astype(int)
+
+
+def _children(parents):
+    children = [[] for _ in parents]
+    for j, p in enumerate(parents):
+        if p >= 0:
+            children[p].append(j)
+    return children
+
+
+def _anchors(j, children, valid):
+    """
+    Nearest observed descendants of j: list of (joint, path) where path holds the
+    unobserved joints between j and that descendant.
+    """
+    found = []
+    stack = [(c, []) for c in children[j]]
+    while stack:
+        d, path = stack.pop()
+        if valid[d]:
+            found.append((d, path))
+        else:
+            stack.extend((c, path + [d]) for c in children[d])
+    return found
+
+
+def _minimal_rotation(a, b):
+    """(T, 3, 3) smallest rotations turning the directions a (T, 3) into b (T, 3)."""
+    a = a / np.maximum(np.linalg.norm(a, axis=-1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=-1, keepdims=True), 1e-12)
+    axis = np.cross(a, b)
+    sin = np.linalg.norm(axis, axis=-1)
+    cos = np.sum(a * b, axis=-1)
+    angle = np.arctan2(sin, cos)
+    # opposite vectors: any axis perpendicular to a works
+    flip = sin < 1e-8
+    if flip.any():
+        helper = np.where(np.abs(a[flip, :1]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]])
+        axis[flip] = np.cross(a[flip], helper)
+    axis = axis / np.maximum(np.linalg.norm(axis, axis=-1, keepdims=True), 1e-12)
+    return Rotation.from_rotvec(axis * angle[:, None]).as_matrix()
+
+
+def _kabsch(src, dst):
+    """(T, 3, 3) rotations R minimising sum |R src_k - dst_k|^2 for src, dst (T, K, 3)."""
+    H = np.einsum("tki,tkj->tij", src, dst)
+    U, S, Vt = np.linalg.svd(H)
+    d = np.sign(np.linalg.det(np.einsum("tji,tkj->tik", Vt, U)))
+    D = np.zeros_like(H)
+    D[:, 0, 0] = 1.0
+    D[:, 1, 1] = 1.0
+    D[:, 2, 2] = d
+    R = np.einsum("tji,tjk,tlk->til", Vt, D, U)
+    # (nearly) collinear points only fix the swing, use the minimal rotation instead
+    degenerate = S[:, 1] < 1e-6 * np.maximum(S[:, 0], 1e-12)
+    if degenerate.any():
+        R[degenerate] = _minimal_rotation(src[degenerate].sum(axis=1), dst[degenerate].sum(axis=1))
+    return R
+
+
+def _solve_pattern(targets, valid, rest, parents, pose_mean):
+    """IK for frames (T, n_joints, 3) that all share the same valid mask."""
+    n_frames = len(targets)
+    children = _children(parents)
+    mean_rot = Rotation.from_rotvec(pose_mean.reshape(-1, 3)).as_matrix()
+    G = np.zeros((n_frames, NUM_KINEMATIC_JOINTS, 3, 3))  # world rotation of every joint
+    local = np.zeros((n_frames, NUM_KINEMATIC_JOINTS, 3, 3))
+    P = np.zeros((n_frames, NUM_KINEMATIC_JOINTS, 3))  # posed joint positions
+
+    # ---- root: Procrustes on the torso ----
+    root_idx = [j for j in ROOT_ALIGN_JOINTS if valid[j]]
+    if len(root_idx) >= 3:
+        src = rest[root_idx]
+        dst = targets[:, root_idx]
+        src_c = src.mean(axis=0)
+        dst_c = dst.mean(axis=1)
+        R0 = _kabsch(np.broadcast_to(src - src_c, dst.shape), dst - dst_c[:, None])
+        t = dst_c - np.einsum("tij,j->ti", R0, src_c)
+    else:
+        R0 = np.broadcast_to(np.eye(3), (n_frames, 3, 3)).copy()
+        t = targets[:, 0] - rest[0] if valid[0] else np.zeros((n_frames, 3))
+    G[:, 0] = local[:, 0] = R0
+    P[:, 0] = np.einsum("tij,j->ti", R0, rest[0]) + t
+    transl = t + np.einsum("tij,j->ti", R0, rest[0]) - rest[0]
+
+    # ---- kinematic chain ----
+    for j in range(1, NUM_KINEMATIC_JOINTS):
+        parent = parents[j]
+        G_parent = G[:, parent]
+        P[:, j] = P[:, parent] + np.einsum("tij,j->ti", G_parent, rest[j] - rest[parent])
+        origin = targets[:, j] if valid[j] else P[:, j]
+        anchors = _anchors(j, children, valid)
+        if not anchors:
+            local[:, j] = mean_rot[j]
+            G[:, j] = G_parent @ mean_rot[j]
+            continue
+        anchor_idx = [d for d, _ in anchors]
+        src = np.einsum("tij,kj->tki", G_parent, rest[anchor_idx] - rest[j])
+        dst = targets[:, anchor_idx] - origin[:, None]
+        if len(anchors) >= 2:
+            delta = _kabsch(src, dst)
+        else:
+            delta = _minimal_rotation(src[:, 0], dst[:, 0])
+        # share the rotation with the unobserved joints every anchor is reached through
+        shared = 0
+        paths = [path for _, path in anchors]
+        while all(len(path) > shared for path in paths) and len({path[shared] for path in paths}) == 1:
+            shared += 1
+        if shared:
+            delta = Rotation.from_matrix(delta)
+            delta = Rotation.from_rotvec(delta.as_rotvec() / (shared + 1)).as_matrix()
+        G[:, j] = delta @ G_parent
+        local[:, j] = np.einsum("tji,tjk->tik", G_parent, G[:, j])
+
+    pose = Rotation.from_matrix(local.reshape(-1, 3, 3)).as_rotvec().reshape(n_frames, -1)
+    pose = pose - pose_mean[None, : pose.shape[1]]
+    return pose, transl
+
+
+def ik_initial_params(partial_joints_np, evaluator, betas=None, missing_threshold=1e-6):
+    """
+    Closed-form initial pose for frames (T, n_joints, 3).
+    evaluator: joint_forward.JointEvaluator of the model that will be fitted
+    betas: (n_betas,) shape the targets are fitted with (default zeros)
+    Returns a dict name -> (T, size) array in the layout of fitting.POSE_PARAM_SIZES.
+    """
+    partial_joints_np = np.asarray(partial_joints_np, dtype=np.float64)
+    n_frames, n_joints = partial_joints_np.shape[:2]
+    if betas is None:
+        betas = np.zeros(evaluator.n_betas)
+    rest, parents = _rest_skeleton(evaluator, betas)
+    pose_mean = evaluator.pose_mean.double().cpu().numpy()
+    valid = np.linalg.norm(partial_joints_np, axis=-1) > missing_threshold
+
+    full_pose = np.zeros((n_frames, NUM_KINEMATIC_JOINTS * 3))
+    transl = np.zeros((n_frames, 3))
+    # frames with the same set of observed joints are solved together
+    patterns, inverse = np.unique(valid, axis=0, return_inverse=True)
+    for k, pattern in enumerate(patterns):
+        frames = np.nonzero(inverse.reshape(-1) == k)[0]
+        full_pose[frames], transl[frames] = _solve_pattern(
+            partial_joints_np[frames], pattern, rest, parents, pose_mean
+        )
+
+    return {
+        "global_orient": full_pose[:, 0:3],
+        "body_pose": full_pose[:, 3:66],
+        "left_hand_pose": full_pose[:, 75:120],
+        "right_hand_pose": full_pose[:, 120:165],
+        "transl": transl,
+    }
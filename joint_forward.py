@@ -0,0 +1,92 @@
+import weakref
+import torch
+from smplx.lbs import batch_rodrigues, batch_rigid_transform
+
+# ─── Joints-only SMPL-X forward ───────────────────────────────────────────────
+# The fitting loss only looks at the first 76 SMPL-X joints: the 55 kinematic joints
+# plus 21 joints that smplx reads off single mesh vertices (nose, eyes, ears, feet,
+# fingertips). Skinning all 10,475 vertices every iteration is wasted work, so only the
+# rows of the model buffers that belong to those vertices are posed: pose_rotations()
+# and posed_joints() below, used by shaped_model.ShapedModel for a fixed shape.
+# JointEvaluator holds the shape-dependent rest pose of those joints for the closed-form
+# steps that work before a shape is fixed (ik_init.py, shape_estimation.py).
+
+NUM_KINEMATIC_JOINTS = 55
+
+_EVALUATORS = weakref.WeakKeyDictionary()
+
+
+class JointEvaluator(torch.nn.Module):
+    """Rest pose of the first n_joints joints of model as a linear function of the shape."""
+
+    def __init__(self, model, n_joints=76):
+        super().__init__()
+        extra_idx = model.vertex_joint_selector.extra_joints_idxs
+        n_extra = n_joints - NUM_KINEMATIC_JOINTS
+        if not 0 <= n_extra <= len(extra_idx):
+            raise ValueError(f"JointEvaluator supports at most {NUM_KINEMATIC_JOINTS + len(extra_idx)} joints, "
+                             f"got {n_joints}")
+        vertex_idx = extra_idx[:n_extra]
+
+        self.n_joints = n_joints
+        self.n_betas = model.shapedirs.shape[-1]
+        # rest joints and their shape directions, J_regressor applied once up front,
+        # followed by the rows of the landmark vertices
+        J_template = model.J_regressor @ model.v_template
+        J_shapedirs = torch.einsum("jv,vcb->jcb", model.J_regressor, model.shapedirs)
+        self.register_buffer("template", torch.cat([J_template, model.v_template[vertex_idx]]))
+        self.register_buffer("shapedirs", torch.cat([J_shapedirs, model.shapedirs[vertex_idx]]))
+        # the landmark joints hang off the joint that skins their vertex most
+        parents = torch.cat([model.parents, model.lbs_weights[vertex_idx].argmax(dim=1)])
+        parents[0] = -1
+        self.register_buffer("parents", parents)
+        self.register_buffer("pose_mean", model.pose_mean)
+
+    def rest_basis(self):
+        """
+        (template (n_joints, 3), shapedirs (n_joints, 3, n_betas), parents (n_joints,)):
+        the rest joints are template + shapedirs @ betas; the root's parent is -1.
+        """
+        return self.template, self.shapedirs, self.parents
+
+
+def pose_rotations(module, global_orient, body_pose, left_hand_pose, right_hand_pose):
+    """
+    (B, 55, 3, 3) rotations of the full SMPL-X pose with the face pose at zero. module holds
+    the model's pose_mean buffer and, when module.use_pca, the hand PCA components.
+    """
+    batch_size = global_orient.shape[0]
+    if module.use_pca:
+        left_hand_pose = left_hand_pose @ module.left_hand_components
+        right_hand_pose = right_hand_pose @ module.right_hand_components
+    face_pose = torch.zeros((batch_size, 9), dtype=global_orient.dtype, device=global_orient.device)  # jaw, eyes
+    full_pose = torch.cat([global_orient, body_pose, face_pose, left_hand_pose, right_hand_pose], dim=1)
+    full_pose = full_pose + module.pose_mean
+    return batch_rodrigues(full_pose.view(-1, 3)).view(batch_size, -1, 3, 3)
+
+
+def posed_joints(rot_mats, J, v_shaped, posedirs, lbs_weights, parents):
+    """
+    Posed kinematic joints followed by the posed landmark vertices (without translation).
+    J: (B or 1, 55, 3) rest joints, v_shaped: (B or 1, L, 3) shaped landmark vertices with
+    their rows of posedirs (P, L*3) and lbs_weights (L, 55).
+    """
+    batch_size = rot_mats.shape[0]
+    dtype, device = rot_mats.dtype, rot_mats.device
+    J_transformed, A = batch_rigid_transform(rot_mats, J.expand(batch_size, -1, -1), parents, dtype=dtype)
+    if not v_shaped.shape[1]:
+        return J_transformed
+    ident = torch.eye(3, dtype=dtype, device=device)
+    pose_feature = (rot_mats[:, 1:] - ident).view(batch_size, -1)
+    v_posed = v_shaped + (pose_feature @ posedirs).view(batch_size, -1, 3)
+    T = torch.einsum("vj,bjmn->bvmn", lbs_weights, A)
+    verts = (T[..., :3, :3] @ v_posed.unsqueeze(-1)).squeeze(-1) + T[..., :3, 3]
+    return torch.cat([J_transformed, verts], dim=1)
+
+
+def get_joint_evaluator(model, n_joints=76):
+    """JointEvaluator for model, built once per model and joint count."""
+    per_model = _EVALUATORS.setdefault(model, {})
+    if n_joints not in per_model:
+        per_model[n_joints] = JointEvaluator(model, n_joints).to(model.v_template.device)
+    return per_model[n_joints]
@@ -0,0 +1,84 @@
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+# ─── Motion-adaptive keyframes ────────────────────────────────────────────────
+# Near-static stretches of a capture do not need a full solve per frame. Keyframes are
+# picked from the input joint motion; only they are fitted, the frames in between get
+# their pose by slerping every joint rotation between the two surrounding keyframes
+# (the translation is interpolated linearly). fitting.fit_frames_keyframes then checks
+# the interpolated frames against their targets and refits the ones that do not match.
+
+
+def select_keyframes(partial_joints_np, missing_threshold=1e-6, motion_threshold=0.01, curvature_threshold=0.01,
+                     max_gap=10):
+    """
+    Sorted indices of the frames to fit: the first and the last frame, every frame whose
+    valid joints have moved by more than motion_threshold since the previous keyframe
+    (mean distance, metres), every frame where the joints accelerate by more than
+    curvature_threshold (mean |second difference|, metres / frame^2) and at least every
+    max_gap frames.
+    """
+    joints = np.asarray(partial_joints_np, dtype=np.float64)
+    n_frames = len(joints)
+    valid = np.linalg.norm(joints, axis=-1) > missing_threshold
+    curvature = np.zeros(n_frames)
+    if n_frames > 2:
+        both = valid[2:] & valid[1:-1] & valid[:-2]
+        second = np.linalg.norm(joints[2:] - 2 * joints[1:-1] + joints[:-2], axis=-1) * both
+        curvature[1:-1] = second.sum(axis=1) / np.maximum(both.sum(axis=1), 1)
+
+    keys = [0]
+    for t in range(1, n_frames):
+        last = keys[-1]
+        both = valid[t] & valid[last]
+        motion = np.linalg.norm(joints[t] - joints[last], axis=-1)[both].mean() if both.any() else 0.0
+        if (motion > motion_threshold or curvature[t] > curvature_threshold or t - last >= max_gap
+                or t == n_frames - 1):
+            keys.append(t)
+    return np.array(keys)
+
+
+def _slerp(q0, q1, w):
+    """Spherical interpolation of unit quaternions (..., 4) with weights w (...)."""
+    dot = (q0 * q1).sum(axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)  # shorter arc
+    dot = np.abs(dot).clip(max=1.0)
+    angle = np.arccos(dot)
+    sin = np.sin(angle)
+    w = w[..., None]
+    small = sin < 1e-6
+    safe = np.where(small, 1.0, sin)
+    a = np.where(small, 1 - w, np.sin((1 - w) * angle) / safe)
+    b = np.where(small, w, np.sin(w * angle) / safe)
+    q = a * q0 + b * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def interpolate_params(key_frames, key_params, frames, rotation_offsets=None):
+    """
+    Parameters of frames (between the first and last keyframe) interpolated from the
+    keyframes' key_params (name -> (K, size)). "transl" is interpolated linearly, every
+    other entry is a stack of axis-angle rotations and is slerped per joint.
+    rotation_offsets: optional name -> (size,) added before converting to rotations and
+    removed afterwards (the model's mean hand pose, so the actual joint rotations are slerped).
+    Returns name -> (len(frames), size) arrays.
+    """
+    key_frames = np.asarray(key_frames)
+    frames = np.asarray(frames)
+    rotation_offsets = rotation_offsets or {}
+    right = np.clip(np.searchsorted(key_frames, frames), 1, len(key_frames) - 1)
+    left = right - 1
+    w = (frames - key_frames[left]) / (key_frames[right] - key_frames[left])
+
+    params = {}
+    for name, p in key_params.items():
+        p = np.asarray(p, dtype=np.float64)
+        if name == "transl":
+            params[name] = ((1 - w)[:, None] * p[left] + w[:, None] * p[right]).astype(np.float32)
+            continue
+        offset = np.asarray(rotation_offsets.get(name, 0.0), dtype=np.float64)
+        quats = Rotation.from_rotvec((p + offset).reshape(-1, 3)).as_quat().reshape(len(p), -1, 4)
+        q = _slerp(quats[left], quats[right], np.repeat(w[:, None], quats.shape[1], axis=1))
+        rotvec = Rotation.from_quat(q.reshape(-1, 4)).as_rotvec().reshape(len(frames), -1)
+        params[name] = (rotvec - offset).astype(np.float32)
+    return params
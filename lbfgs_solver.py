@@ -0,0 +1,137 @@
+import numpy as np
+import torch
+
+# ─── Batched per-frame L-BFGS ─────────────────────────────────────────────────
+# torch.optim.LBFGS treats a batch of frames as one problem: one curvature history, one
+# line search and one stopping test for the summed loss, so a frame's result depends on
+# the other frames of its batch. solve_lbfgs keeps all of that per frame instead. Every
+# iteration runs one forward/backward over the active frames; each frame builds its
+# direction from its own last `history_size` steps (two-loop recursion), backtracks its
+# own step length until the Armijo condition holds and stops on its own tolerances.
+
+
+def _loss_and_grad(losses, x, extra):
+    x = x.detach().requires_grad_(True)
+    with torch.enable_grad():
+        loss = losses(x, *extra)
+        grad, = torch.autograd.grad(loss.sum(), x)
+    return loss.detach(), grad
+
+
+def _direction(grad, s_hist, y_hist, rho, n_hist):
+    """-H grad per frame from the stored (s, y) pairs (two-loop recursion); newest pair last."""
+    m = s_hist.shape[1]
+    valid = torch.arange(m, device=grad.device)[None] >= (m - n_hist)[:, None]  # (A, m)
+    q = grad.clone()
+    alpha = torch.zeros_like(rho)
+    for j in reversed(range(m)):
+        alpha[:, j] = torch.where(valid[:, j], rho[:, j] * (s_hist[:, j] * q).sum(dim=1), 0.0)
+        q -= alpha[:, j, None] * y_hist[:, j]
+    y_last = y_hist[:, -1]
+    gamma = torch.where(n_hist > 0, (s_hist[:, -1] * y_last).sum(dim=1) / (y_last * y_last).sum(dim=1).clamp(min=1e-30),
+                        torch.ones_like(rho[:, 0]))
+    r = gamma[:, None] * q
+    for j in range(m):
+        beta = rho[:, j] * (y_hist[:, j] * r).sum(dim=1)
+        r += torch.where(valid[:, j], alpha[:, j] - beta, 0.0)[:, None] * s_hist[:, j]
+    return -r
+
+
+def solve_lbfgs(
+    losses,
+    x0,
+    extra=(),
+    max_iter=50,
+    tolerance_grad=1e-7,
+    tolerance_change=1e-9,
+    history_size=10,
+    max_ls=10,
+    c1=1e-4,
+    label="L-BFGS",
+    log_every=10,
+):
+    """
+    Minimise losses(x, *extra)[t] independently for every row t of x0.
+    losses: batched differentiable function, x (A, P) and the extras of those A frames -> (A,)
+    x0: (T, P) start values; extra: tuple of (T, ...) tensors, sliced like x
+    Like torch.optim.LBFGS, a frame stops when its largest gradient entry is below
+    tolerance_grad or its step or loss change is below tolerance_change; it also stops
+    when its line search finds no decrease in max_ls halvings.
+    Returns (x (T, P), loss (T,), iterations (T,) numpy array, failed (T,) numpy bool:
+    the loss was not finite).
+    """
+    n_frames, n_unknowns = x0.shape
+    device = x0.device
+    x = x0.detach().clone()
+    loss, grad = _loss_and_grad(losses, x, extra)
+    s_hist = torch.zeros(n_frames, history_size, n_unknowns, dtype=x.dtype, device=device)
+    y_hist = torch.zeros_like(s_hist)
+    rho = torch.zeros(n_frames, history_size, dtype=x.dtype, device=device)
+    n_hist = torch.zeros(n_frames, dtype=torch.long, device=device)
+    failed = ~torch.isfinite(loss)
+    active = ~failed & (grad.abs().amax(dim=1) > tolerance_grad)
+    used = np.zeros(n_frames, dtype=int)
+
+    for i in range(max_iter):
+        idx = active.nonzero().squeeze(1)
+        if not len(idx):
+            break
+        g = grad[idx]
+        d = _direction(g, s_hist[idx], y_hist[idx], rho[idx], n_hist[idx])
+        slope = (g * d).sum(dim=1)
+        # no descent direction (bad curvature pairs): restart from steepest descent
+        restart = slope >= 0
+        d[restart] = -g[restart]
+        slope = torch.where(restart, -(g * g).sum(dim=1), slope)
+        n_hist[idx[restart]] = 0
+        # first step of a frame: scaled like torch.optim.LBFGS
+        first = n_hist[idx] == 0
+        t = torch.where(first, (1.0 / g.abs().sum(dim=1).clamp(min=1e-30)).clamp(max=1.0), torch.ones_like(slope))
+
+        # backtracking line search, every frame with its own step length
+        new_loss, new_grad = loss[idx].clone(), g.clone()
+        accepted = torch.zeros(len(idx), dtype=torch.bool, device=device)
+        for _ in range(max_ls):
+            pending = (~accepted).nonzero().squeeze(1)
+            if not len(pending):
+                break
+            frames = idx[pending]
+            trial_loss, trial_grad = _loss_and_grad(losses, x[frames] + t[pending, None] * d[pending],
+                                                    [e[frames] for e in extra])
+            ok = torch.isfinite(trial_loss) & (trial_loss <= loss[frames] + c1 * t[pending] * slope[pending])
+            new_loss[pending[ok]] = trial_loss[ok]
+            new_grad[pending[ok]] = trial_grad[ok]
+            accepted[pending[ok]] = True
+            t[pending[~ok]] *= 0.5
+
+        with torch.no_grad():
+            step = t[:, None] * d
+            acc = idx[accepted]
+            s, y = step[accepted], new_grad[accepted] - g[accepted]
+            # keep only pairs with positive curvature, so the inverse Hessian stays positive definite
+            ys = (y * s).sum(dim=1)
+            keep = ys > 1e-10
+            upd = acc[keep]
+            s_hist[upd] = torch.cat([s_hist[upd, 1:], s[keep, None]], dim=1)
+            y_hist[upd] = torch.cat([y_hist[upd, 1:], y[keep, None]], dim=1)
+            rho[upd] = torch.cat([rho[upd, 1:], (1.0 / ys[keep])[:, None]], dim=1)
+            n_hist[upd] = (n_hist[upd] + 1).clamp(max=history_size)
+
+            change = (loss[acc] - new_loss[accepted]).abs()
+            x[acc] += s
+            loss[acc] = new_loss[accepted]
+            grad[acc] = new_grad[accepted]
+            used[idx.cpu().numpy()] = i + 1
+
+            done = ~accepted.clone()
+            done[accepted] = ((grad[acc].abs().amax(dim=1) <= tolerance_grad)
+                              | (s.abs().amax(dim=1) <= tolerance_change) | (change < tolerance_change))
+            active[idx[done]] = False
+
+        if (i + 1) % log_every == 0 or i == 0:
+            print(f"[{label}] Iter {i+1}/{max_iter}  mean loss={loss.mean().item():.8f}  "
+                  f"active frames {int(active.sum())}/{n_frames}")
+    if max_iter:
+        print(f"[{label}] frames converged early: {(used < max_iter).sum()}/{n_frames}, "
+              f"max iterations used {used.max()}")
+    return x, loss, used, failed.cpu().numpy()
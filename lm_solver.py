@@ -0,0 +1,94 @@
+import numpy as np
+import torch
+from torch.func import jacfwd, vmap
+
+# ─── Batched Levenberg-Marquardt ──────────────────────────────────────────────
+# Fitting one frame is a small nonlinear least-squares problem (~160 unknowns,
+# ~230 residuals). Instead of hundreds of first-order steps, every LM iteration takes
+# the exact per-frame Jacobians of all active frames at once (analytic when the caller
+# has them, otherwise forward-mode autodiff under vmap), solves the damped normal
+# equations (J^T J + lambda diag(J^T J)) dx = -J^T r for all of them in one batched
+# solve, and adapts lambda per frame: accepted steps lower it, rejected ones raise it.
+# Frames leave the batch as soon as they converge.
+
+
+def solve_lm(
+    residuals,
+    x0,
+    extra=(),
+    jacobian=None,
+    max_iter=50,
+    damping=1e-3,
+    rel_tol=1e-6,
+    step_tol=1e-7,
+    max_damping=1e8,
+    label="LM",
+    log_every=10,
+):
+    """
+    Minimise |residuals(x, *extra)[t]|^2 independently for every row t of x0.
+    residuals: batched function, x (A, P) and the extras of those A frames -> (A, R)
+    x0: (T, P) start values; extra: tuple of (T, ...) tensors, sliced like x
+    jacobian: optional batched function with the same arguments -> (residuals (A, R),
+        Jacobian (A, R, P)); by default torch.func.jacfwd of residuals under vmap
+    A frame stops when an accepted step lowers its cost by less than a relative rel_tol,
+    when its step is shorter than step_tol, or when lambda exceeds max_damping.
+    Returns (x (T, P), cost (T,), iterations (T,) numpy array).
+    """
+    if jacobian is None:
+        def single(x, *frame_extra):
+            return residuals(x[None], *(e[None] for e in frame_extra))[0]
+        per_frame = vmap(jacfwd(single))
+
+        def jacobian(x, *frame_extra):
+            return residuals(x, *frame_extra), per_frame(x, *frame_extra)
+
+    n_frames = x0.shape[0]
+    device = x0.device
+    x = x0.detach().clone()
+    with torch.no_grad():
+        r = residuals(x, *extra)
+    cost = r.pow(2).sum(dim=1)
+    lam = torch.full((n_frames,), damping, dtype=torch.float64, device=device)
+    active = torch.ones(n_frames, dtype=torch.bool, device=device)
+    used = np.full(n_frames, max_iter)
+
+    for i in range(max_iter):
+        idx = active.nonzero().squeeze(1)
+        frame_extra = [e[idx] for e in extra]
+        with torch.no_grad():
+            _, J = jacobian(x[idx], *frame_extra)
+        J = J.double()  # (A, R, P)
+        JtJ = J.transpose(1, 2) @ J
+        g = (J.transpose(1, 2) @ r[idx].double().unsqueeze(-1)).squeeze(-1)
+        # Marquardt scaling: damp every unknown relative to its own curvature
+        diag = JtJ.diagonal(dim1=1, dim2=2).clamp(min=1e-9)
+        step = -torch.linalg.solve(JtJ + lam[idx, None, None] * torch.diag_embed(diag), g).to(x.dtype)
+
+        with torch.no_grad():
+            x_new = x[idx] + step
+            r_new = residuals(x_new, *frame_extra)
+            cost_new = r_new.pow(2).sum(dim=1)
+            accept = cost_new < cost[idx]
+            decrease = (cost[idx] - cost_new) / cost[idx].clamp(min=1e-30)
+
+            accepted = idx[accept]
+            x[accepted] = x_new[accept]
+            r[accepted] = r_new[accept]
+            cost[accepted] = cost_new[accept]
+            lam[idx] = torch.where(accept, lam[idx] / 3, lam[idx] * 4).clamp(min=1e-12)
+
+            done = (accept & (decrease < rel_tol)) | (step.norm(dim=1) < step_tol) | (lam[idx] > max_damping)
+            done_idx = idx[done]
+            used[done_idx.cpu().numpy()] = i + 1
+            active[done_idx] = False
+
+        if (i + 1) % log_every == 0 or i == 0:
+            print(f"[{label}] Iter {i+1}/{max_iter}  mean cost={cost.mean().item():.8f}  "
+                  f"active frames {int(active.sum())}/{n_frames}")
+        if not active.any():
+            break
+    if max_iter:
+        print(f"[{label}] frames converged early: {(used < max_iter).sum()}/{n_frames}, "
+              f"max iterations used {used.max()}")
+    return x, cost, used
@@ -0,0 +1,65 @@
+import numpy as np
+
+# ─── Batch size from a memory budget ──────────────────────────────────────────
+# Larger batches fit faster, but every frame of a batch adds its share of the solver's
+# working memory, and every frame of a chunk keeps its mesh until the chunk is written.
+# The optimization stages only pose the joints; the full-vertex skinning runs once at
+# the end, without autograd and in OUTPUT_BATCH sized pieces (fitting._evaluate), so it
+# does not grow with the batch. Peak RSS measured per additional frame on CPU (76 input
+# joints, batch 128-512, including the frame's own result):
+#
+#     Adam stages (stage1 / stage2)    ~0.41 MB
+#     + L-BFGS history                 ~0.62 MB
+#     LM (per-frame Jacobians)         ~2.2 MB
+#
+# Gradient checkpointing of the joint loss was measured too: the graph through the
+# joints path is small, so it saved nothing and made the Adam stages ~40% slower.
+
+# Python, torch, the SMPL-X model, its shaped template and the shape estimation in one
+# process (0.92 GB measured for get_mesh_from_3dpoints.py with batches of 1)
+BASE_BYTES = 950 * 2**20
+
+# working memory per frame of a batch and stage, for 76 input joints (results not included)
+STAGE_FRAME_BYTES = {
+    "stage1": 160 * 2**10,
+    "stage2": 160 * 2**10,
+    "lbfgs": 370 * 2**10,
+    "lm": 1950 * 2**10,
+    "lm_refine": 1950 * 2**10,
+}
+
+
+def result_frame_bytes(n_vertices, n_model_joints=127):
+    """One frame of a fit result: float32 vertices and model joints."""
+    return 4 * 3 * (n_vertices + n_model_joints)
+
+
+def batch_frame_bytes(schedule, n_vertices, n_joints=76):
+    """Peak memory per frame of a fit_frames_batched batch with schedule."""
+    stages = [STAGE_FRAME_BYTES[stage] for stage in STAGE_FRAME_BYTES if stage in schedule]
+    working = max(stages, default=0) * n_joints / 76
+    return int(working + 2 * result_frame_bytes(n_vertices))  # the batch result and its output pieces
+
+
+def batch_size_for_budget(budget_bytes, schedule, n_vertices, n_joints=76, chunk_size=100, workers=1):
+    """
+    (batch_size, chunk_size) for fitting with schedule in budget_bytes in total, split over
+    `workers` processes that each fit chunk_size frames per chunk (see pipeline.fit_chunks):
+    the largest batch (at most chunk_size) whose working memory fits next to the process
+    overhead and the results of the worker's chunk. The chunk is shortened when its
+    results alone do not leave room for a batch of 1.
+    Raises ValueError when not even that fits.
+    """
+    per_worker = budget_bytes / max(workers, 1) - BASE_BYTES
+    per_frame = batch_frame_bytes(schedule, n_vertices, n_joints)
+    result = result_frame_bytes(n_vertices)
+    room = per_worker - chunk_size * result
+    if room < per_frame:
+        chunk_size = int(np.floor((per_worker - per_frame) / result))
+        if chunk_size < 1:
+            raise ValueError(f"A memory budget of {budget_bytes / 2**30:.2f} GB is too small for "
+                             f"{workers} worker(s): each needs at least "
+                             f"{(BASE_BYTES + per_frame + result) / 2**30:.2f} GB")
+        room = per_worker - chunk_size * result
+    batch_size = int(min(room // per_frame, chunk_size))
+    return batch_size, chunk_size
@@ -0,0 +1,106 @@
+import os
+import argparse
+import torch
+import smplx
+
+# ─── Process-level SMPL-X model registry ──────────────────────────────────────
+# smplx.create parses the model .npz and rebuilds every buffer, which is far too
+# slow to do per frame. Models are built once per process and configuration, and the
+# built module is also written next to the source file as a torch archive that
+# torch.load can memory-map, so later processes skip the .npz parsing entirely.
+
+_MODEL_CACHE = {}
+
+
+def source_model_file(model_path, gender="male"):
+    """Resolve the SMPL-X .npz the same way smplx.create does (models dir, smplx dir or file)."""
+    if os.path.isdir(model_path):
+        smplx_dir = os.path.join(model_path, "smplx")
+        if os.path.isdir(smplx_dir):
+            model_path = smplx_dir
+        return os.path.join(model_path, f"SMPLX_{gender.upper()}.npz")
+    return model_path
+
+
+def converted_model_file(model_path, gender="male", use_pca=False, num_pca_comps=12, flat_hand_mean=False):
+    """Path of the pre-converted (memory-mappable) model for this configuration."""
+    source = source_model_file(model_path, gender)
+    hands = f"pca{num_pca_comps}" if use_pca else "fullhand"
+    mean = "flatmean" if flat_hand_mean else "handmean"
+    return os.path.splitext(source)[0] + f"_{hands}_{mean}.pt"
+
+
+def build_model(model_path, gender="male", use_pca=False, num_pca_comps=12, flat_hand_mean=False):
+    return smplx.create(
+        model_path=model_path,
+        model_type="smplx",
+        gender=gender,
+        use_pca=use_pca,
+        num_pca_comps=num_pca_comps,
+        flat_hand_mean=flat_hand_mean,
+        create_global_orient=True,
+        create_body_pose=True,
+        create_betas=True,
+        create_left_hand_pose=True,
+        create_right_hand_pose=True,
+        use_face_contour=False,
+    )
+
+
+def convert_model(model_path, gender="male", use_pca=False, num_pca_comps=12, flat_hand_mean=False):
+    """One-time conversion of the SMPL-X .npz into a torch archive. Returns the built model."""
+    model = build_model(model_path, gender, use_pca, num_pca_comps, flat_hand_mean)
+    target = converted_model_file(model_path, gender, use_pca, num_pca_comps, flat_hand_mean)
+    tmp = f"{target}.{os.getpid()}.tmp"  # parallel runs may convert the same model at once
+    torch.save(model, tmp)
+    os.replace(tmp, target)  # never leave a half-written archive behind
+    return model
+
+
+def _load_converted(model_path, gender, use_pca, num_pca_comps, flat_hand_mean):
+    source = source_model_file(model_path, gender)
+    target = converted_model_file(model_path, gender, use_pca, num_pca_comps, flat_hand_mean)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        try:
+            return torch.load(target, mmap=True, weights_only=False)
+        except Exception as e:
+            # e.g. archive written by another torch/smplx version -> rebuild it
+            print(f"Could not load converted model {target} ({e}), converting again")
+    return convert_model(model_path, gender, use_pca, num_pca_comps, flat_hand_mean)
+
+
+def get_model(model_path, gender="male", use_pca=False, num_pca_comps=12, flat_hand_mean=False, device=None):
+    """
+    Return the shared SMPL-X model for this configuration, loading it at most once per process.
+    The module's own pose/shape parameters are frozen; callers pass their tensors explicitly.
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if not use_pca:
+        num_pca_comps = 0  # ignored by smplx without PCA, keep one entry for all values
+    key = (os.path.abspath(source_model_file(model_path, gender)), gender, use_pca, num_pca_comps,
+           flat_hand_mean, str(device))
+    if key not in _MODEL_CACHE:
+        model = _load_converted(model_path, gender, use_pca, num_pca_comps, flat_hand_mean)
+        model.requires_grad_(False)
+        _MODEL_CACHE[key] = model.eval().to(device)
+    return _MODEL_CACHE[key]
+
+
+def model_faces(model_path, gender="male"):
+    """(F, 3) face indices of the SMPL-X mesh."""
+    return get_model(model_path, gender, device=torch.device("cpu")).faces
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-convert SMPL-X models into the fast loading format")
+    parser.add_argument("--model", type=str, default="models", help="Path to SMPL-X model folder (default: ./models)")
+    parser.add_argument("--gender", type=str, nargs="+", default=["male"], help="Genders to convert (default: male)")
+    parser.add_argument("--use_pca", action="store_true", help="Convert the PCA hand variant")
+    parser.add_argument("--num_pca_comps", type=int, default=12, help="Number of hand PCA components (default: 12)")
+    args = parser.parse_args()
+
+    for gender in args.gender:
+        convert_model(args.model, gender, args.use_pca, args.num_pca_comps)
+        print(f"Converted {source_model_file(args.model, gender)} → "
+              f"{converted_model_file(args.model, gender, args.use_pca, args.num_pca_comps)}")
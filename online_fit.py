@@ -0,0 +1,299 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import contextlib
+from collections import deque
+import numpy as np
+from causal_filter import CausalLowpass
+from fitting import (
+    LM_SCHEDULE,
+    LM_WARM_SCHEDULE,
+    POSE_PARAM_SIZES,
+    fit_frames_batched,
+    schedule_with_budget,
+)
+
+# ─── Online fitting of a live joint stream ────────────────────────────────────
+# Reads (J, 3) frames from stdin or a local TCP / Unix socket as they arrive, fits each
+# one as soon as it is complete and writes one JSON line per frame back (parameters,
+# model joints, residual, latency). Every frame is seeded from the previous solution
+# (extrapolated with its velocity) and refined with a bounded iteration budget; a frame
+# whose residual jumps is refitted cold. Only the last `history` frames are kept, in
+# preallocated ring buffers, so memory stays flat however long the stream runs.
+#
+#     tracker | python online_fit.py --model models > fits.jsonl
+#     python online_fit.py --model models --listen tcp:127.0.0.1:5555
+#
+# --smooth_hz low-passes the sent parameters and joints with a causal filter
+# (causal_filter.py); --smooth_lag L then holds every frame back until L newer ones
+# arrived, which makes the result close to the offline zero-phase smoothing.
+#
+# Input frames are one line of J*3 numbers each (separated by spaces or commas, JSON
+# brackets are ignored) or, with --binary, J*3 little-endian float32 values.
+
+
+class RingBuffer:
+    """The last `capacity` rows of shape row_shape; older rows are overwritten."""
+
+    def __init__(self, capacity, row_shape=(), dtype=np.float64):
+        self.data = np.zeros((capacity,) + tuple(row_shape), dtype=dtype)
+        self.count = 0
+
+    def append(self, row):
+        self.data[self.count % len(self.data)] = row
+        self.count += 1
+
+    def last(self, k=1):
+        """Row k steps back (1: the newest)."""
+        return self.data[(self.count - k) % len(self.data)]
+
+    def values(self):
+        """Stored rows, oldest first."""
+        n = min(self.count, len(self.data))
+        start = self.count - n
+        return np.take(self.data, np.arange(start, start + n) % len(self.data), axis=0)
+
+
+class OnlineFitter:
+    """
+    Fits one frame at a time, warm-started from the previous frames' solutions.
+    The first frame, and every frame after a reset() or a residual jump of more than
+    max(fallback_ratio * previous residual, fallback_min), is fitted with cold_schedule.
+    """
+
+    def __init__(
+        self,
+        smplx_model_path,
+        betas=None,
+        cold_schedule=LM_SCHEDULE,
+        warm_schedule=LM_WARM_SCHEDULE,
+        extrapolate=True,
+        fallback_ratio=1.5,
+        fallback_min=1e-3,
+        history=256,
+        missing_threshold=1e-6,
+        device=None,
+        verbose=False,
+    ):
+        self.smplx_model_path = smplx_model_path
+        self.betas = betas
+        self.cold_schedule = cold_schedule
+        self.warm_schedule = warm_schedule
+        self.extrapolate = extrapolate
+        self.fallback_ratio = fallback_ratio
+        self.fallback_min = fallback_min
+        self.missing_threshold = missing_threshold
+        self.device = device
+        self.verbose = verbose
+        self.params = RingBuffer(history, (sum(POSE_PARAM_SIZES.values()),), np.float32)
+        self.residual = RingBuffer(history)
+        self.latency = RingBuffer(history)
+        self.n_frames = 0
+        self.n_cold = 0
+        self.warm = 0  # consecutive frames of the current warm-start run
+
+    def reset(self):
+        """Fit the next frame cold, e.g. after the tracker lost the person."""
+        self.warm = 0
+
+    def _fit(self, frame, schedule, init_params=None):
+        log = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+        with log:
+            return fit_frames_batched(frame[None], self.smplx_model_path, self.missing_threshold, self.device,
+                                      init_params=init_params, schedule=schedule, betas=self.betas)
+
+    def _init_params(self):
+        vector = self.params.last(1)
+        if self.extrapolate and self.warm > 1:
+            vector = 2 * vector - self.params.last(2)
+        sizes = list(POSE_PARAM_SIZES.values())
+        parts = np.split(vector[None], np.cumsum(sizes)[:-1], axis=1)
+        return dict(zip(POSE_PARAM_SIZES, parts))
+
+    def fit(self, frame, received=None):
+        """
+        Fit one (J, 3) frame. received: time.perf_counter() at which the frame arrived
+        (default: now); the latency is measured from there.
+        Returns the fit_frames_batched result of the frame plus "latency" (seconds) and "cold".
+        """
+        received = time.perf_counter() if received is None else received
+        frame = np.asarray(frame, dtype=np.float32)
+        cold = self.warm == 0
+        if cold:
+            fit = self._fit(frame, self.cold_schedule)
+        else:
+            fit = self._fit(frame, self.warm_schedule, self._init_params())
+            if fit["residual"][0] > max(self.fallback_ratio * self.residual.last(1), self.fallback_min):
+                fit = self._fit(frame, self.cold_schedule)
+                cold = True
+        self.params.append(np.concatenate([fit["params"][name][0] for name in POSE_PARAM_SIZES]))
+        self.residual.append(fit["residual"][0])
+        fit["latency"] = time.perf_counter() - received
+        fit["cold"] = cold
+        self.latency.append(fit["latency"])
+        self.n_frames += 1
+        self.n_cold += cold
+        self.warm += 1
+        return fit
+
+    def latency_stats(self):
+        """Latency (ms) over the frames still in the history."""
+        ms = 1000 * self.latency.values()
+        if not len(ms):
+            return {}
+        return {
+            "frames": self.n_frames,
+            "cold": self.n_cold,
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "max_ms": float(ms.max()),
+        }
+
+
+def read_frames(stream, n_joints, binary=False):
+    """(n_joints, 3) float32 frames from a binary file object, until EOF."""
+    if binary:
+        size = n_joints * 3 * 4
+        while True:
+            data = stream.read(size)
+            if len(data) < size:
+                return
+            yield np.frombuffer(data, dtype="<f4").reshape(n_joints, 3)
+    for line in stream:
+        line = line.decode().translate(str.maketrans(",[]", "   ")).strip()
+        if not line:
+            continue
+        values = np.array(line.split(), dtype=np.float32)
+        if len(values) != n_joints * 3:
+            raise ValueError(f"Expected {n_joints * 3} values per frame, got {len(values)}")
+        yield values.reshape(n_joints, 3)
+
+
+def frame_message(index, fit, with_joints=True):
+    """One JSON line for a fitted frame."""
+    message = {
+        "frame": index,
+        "latency_ms": round(1000 * fit["latency"], 3),
+        "residual": float(fit["residual"][0]),
+        "cold": bool(fit["cold"]),
+        "params": {name: p[0].tolist() for name, p in fit["params"].items()},
+    }
+    if with_joints:
+        message["joints"] = fit["joints"][0].round(5).tolist()
+    return json.dumps(message) + "\n"
+
+
+def _smoothing_vector(fit):
+    """Parameters and joints of a single-frame fit as one flat vector."""
+    return np.concatenate([fit["params"][name][0] for name in POSE_PARAM_SIZES] + [fit["joints"][0].ravel()])
+
+
+def _with_smoothed(fit, vector):
+    """fit with parameters and joints replaced by those in a _smoothing_vector."""
+    bounds = np.cumsum(list(POSE_PARAM_SIZES.values()))
+    vector = vector.astype(np.float32)[None]
+    params = np.split(vector[:, :bounds[-1]], bounds[:-1], axis=1)
+    return dict(fit, params=dict(zip(POSE_PARAM_SIZES, params)),
+                joints=vector[:, bounds[-1]:].reshape(fit["joints"].shape))
+
+
+@contextlib.contextmanager
+def open_stream(listen):
+    """(input, output) binary file objects: stdin / stdout, or the first client of tcp:HOST:PORT / unix:PATH."""
+    if listen is None:
+        yield sys.stdin.buffer, sys.stdout.buffer
+        return
+    kind, _, address = listen.partition(":")
+    if kind == "tcp":
+        host, _, port = address.rpartition(":")
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host or "127.0.0.1", int(port)))
+    elif kind == "unix":
+        if os.path.exists(address):
+            os.remove(address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(address)
+    else:
+        raise ValueError(f"--listen must be tcp:HOST:PORT or unix:PATH, got {listen!r}")
+    with server:
+        server.listen(1)
+        print(f"Waiting for a client on {listen}", file=sys.stderr)
+        connection, _ = server.accept()
+        with connection, connection.makefile("rb") as reader, connection.makefile("wb") as writer:
+            if kind == "tcp":
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            yield reader, writer
+    if kind == "unix":
+        os.remove(address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit SMPL-X to a live stream of joints, one frame at a time")
+    parser.add_argument("--model", type=str, default="models", help="Path to the SMPL-X model folder")
+    parser.add_argument("--listen", type=str, default=None,
+                        help="Serve one client on tcp:HOST:PORT or unix:PATH instead of reading stdin / writing stdout")
+    parser.add_argument("--n_joints", type=int, default=76, help="Joints per input frame (default: 76)")
+    parser.add_argument("--binary", action="store_true",
+                        help="Input frames are raw little-endian float32 instead of text lines")
+    parser.add_argument("--params", type=str, default=None,
+                        help="Take the betas from this all_params.npz of an earlier fit (default: mean shape)")
+    parser.add_argument("--max_iter", type=int, default=5,
+                        help="Iteration budget per stage of a warm-started frame (default: 5)")
+    parser.add_argument("--history", type=int, default=256,
+                        help="Frames kept for extrapolation and latency statistics (default: 256)")
+    parser.add_argument("--stats_every", type=int, default=100,
+                        help="Print latency statistics to stderr every this many frames (default: 100, 0: only at the end)")
+    parser.add_argument("--smooth_hz", type=float, default=0.0,
+                        help="Low-pass the sent parameters and joints causally at this cutoff (default: 0 = off)")
+    parser.add_argument("--smooth_lag", type=int, default=0,
+                        help="With --smooth_hz, send every frame this many frames late for a smoother, "
+                             "less delayed result (default: 0)")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate of the stream for --smooth_hz (default: 30)")
+    parser.add_argument("--no_joints", action="store_true", help="Only send parameters, not the model joints")
+    parser.add_argument("--verbose", action="store_true", help="Print the fitting log of every frame to stderr")
+    args = parser.parse_args()
+
+    betas = np.load(args.params)["betas"] if args.params else None
+    fitter = OnlineFitter(
+        args.model, betas, warm_schedule=schedule_with_budget(LM_WARM_SCHEDULE, args.max_iter),
+        history=args.history, verbose=args.verbose,
+    )
+    smoother = CausalLowpass(args.smooth_hz, args.fps, lag=args.smooth_lag) if args.smooth_hz > 0 else None
+    pending = deque()  # (index, fit, received) of the frames the smoother still holds back
+
+    def send(writer, index, fit, received, smoothed=None):
+        if smoothed is not None:
+            fit = _with_smoothed(fit, smoothed)
+        fit["latency"] = time.perf_counter() - received
+        writer.write(frame_message(index, fit, not args.no_joints).encode())
+        writer.flush()
+
+    # the fitting log must not end up in the output stream
+    with open_stream(args.listen) as (reader, writer), contextlib.redirect_stdout(sys.stderr):
+        for index, frame in enumerate(read_frames(reader, args.n_joints, args.binary)):
+            received = time.perf_counter()
+            fit = fitter.fit(frame, received)
+            if smoother is None:
+                send(writer, index, fit, received)
+            else:
+                pending.append((index, fit, received))
+                smoothed = smoother.step(_smoothing_vector(fit))
+                if smoothed is not None:
+                    send(writer, *pending.popleft(), smoothed)
+            if args.stats_every and fitter.n_frames % args.stats_every == 0:
+                print(f"Latency: {json.dumps(fitter.latency_stats())}", file=sys.stderr)
+        if smoother is not None:
+            for smoothed in smoother.flush():
+                send(writer, *pending.popleft(), smoothed)
+    print(f"Done. Latency over the last {min(fitter.n_frames, args.history)} frames: "
+          f"{json.dumps(fitter.latency_stats())}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import numpy as np
+from numpy.lib.format import open_memmap
+
+# ─── Memory-mapped output writer ──────────────────────────────────────────────
+# Meshes are ~125 KB per frame, so collecting them in lists and stacking at the end
+# needs two full copies of the sequence in RAM. Instead the .npy outputs are
+# preallocated as memmaps and every finished chunk is written straight to its rows.
+# The fitted SMPL-X parameters (~170 floats per frame) are the primary output; they
+# are collected in memory and saved as one .npz that decode_params.py turns back into
+# vertices and joints.
+
+
+class OutputWriter:
+    """
+    Writes fitted chunks into preallocated (n_frames, V, 3) / (n_frames, J, 3) .npy memmaps.
+    The files are created on the first chunk, once the vertex and joint counts are known;
+    out_meshes=None skips the meshes. Parameters and small per-frame diagnostics
+    (residual, iterations, timings) are kept in memory.
+    """
+
+    def __init__(self, out_meshes, out_joints, n_frames, dtype=np.float32):
+        self.out_meshes = out_meshes
+        self.out_joints = out_joints
+        self.n_frames = n_frames
+        self.dtype = dtype
+        self.meshes = None
+        self.joints = None
+        self.residual = np.zeros(n_frames)
+        self.iterations = {}
+        self.timings = {}
+        self.params = {}
+
+    def write(self, start, fit):
+        stop = start + len(fit["joints"])
+        if self.joints is None:
+            if self.out_meshes:
+                self.meshes = open_memmap(self.out_meshes, mode="w+", dtype=self.dtype,
+                                          shape=(self.n_frames,) + fit["vertices"].shape[1:])
+            self.joints = open_memmap(self.out_joints, mode="w+", dtype=self.dtype,
+                                      shape=(self.n_frames,) + fit["joints"].shape[1:])
+        if self.meshes is not None:
+            self.meshes[start:stop] = fit["vertices"]
+        self.joints[start:stop] = fit["joints"]
+        self.residual[start:stop] = fit["residual"]
+        for stage, used in fit["iterations"].items():
+            self.iterations.setdefault(stage, np.zeros(self.n_frames, dtype=int))[start:stop] = used
+        for stage, seconds in fit.get("timings", {}).items():
+            self.timings.setdefault(stage, np.zeros(self.n_frames))[start:stop] = seconds
+        for name, p in fit["params"].items():
+            self.params.setdefault(name, np.zeros((self.n_frames,) + p.shape[1:], dtype=np.float32))[start:stop] = p
+
+    def save_params(self, path, betas, **model_config):
+        """
+        Save the fitted parameters, the shared betas and the model settings needed to
+        decode them (see decode_params.load_params).
+        """
+        np.savez(path, betas=np.asarray(betas, dtype=np.float32), residual=self.residual,
+                 **self.params, **{f"model_{key}": np.asarray(value) for key, value in model_config.items()})
+
+    def close(self):
+        for array in (self.meshes, self.joints):
+            if array is not None:
+                array.flush()
+        self.meshes = self.joints = None
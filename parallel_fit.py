@@ -0,0 +1,75 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from fitting import concatenate_results, slice_result
+
+# ─── Process-pool sharded fitting ─────────────────────────────────────────────
+# Batch-size-1 style problems leave most cores idle because PyTorch's intra-op threads
+# have nothing to split. Instead the sequence is cut into contiguous shards that are
+# fitted in separate processes, each with a fixed share of the CPU threads. Starting a
+# worker means importing torch and loading the model again, so a run opens one pool with
+# open_pool() and passes it to fit_frames_sharded() for all of its chunks.
+
+
+def shard_ranges(n_frames, workers):
+    """Contiguous (start, stop) ranges of nearly equal length covering n_frames frames."""
+    bounds = np.linspace(0, n_frames, min(workers, n_frames) + 1).round().astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _init_worker(threads):
+    torch.set_num_threads(threads)
+
+
+def open_pool(workers, threads_per_worker=None):
+    """Process pool of `workers` spawned processes with threads_per_worker torch threads each."""
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    # spawn instead of fork: forking a process that already started torch threads can hang
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(threads_per_worker,),
+    )
+
+
+def _fit_shard(partial_joints_np, smplx_model_path, fit_fn, fit_kwargs, start, stop, warmup_start):
+    print(f"\n=== Worker {os.getpid()}: frames {start+1}-{stop} (warm-up from {warmup_start+1}) ===")
+    fit = fit_fn(partial_joints_np[warmup_start:stop], smplx_model_path, **fit_kwargs)
+    skip = start - warmup_start
+    return slice_result(fit, skip)
+
+
+def fit_frames_sharded(
+    partial_joints_np,
+    smplx_model_path,
+    fit_fn,
+    fit_kwargs,
+    workers,
+    threads_per_worker=None,
+    overlap=8,
+    pool=None,
+):
+    """
+    Run fit_fn(frames, smplx_model_path, **fit_kwargs) on `workers` contiguous shards in a
+    process pool and merge the results in frame order.
+
+    Each worker also fits the `overlap` frames before its shard and throws them away, so
+    sequential modes (warm start, temporal windows) arrive at the shard boundary already
+    warmed up instead of cold-starting there. fit_fn must be a module-level function
+    (it is pickled by reference). pool: an open_pool() of `workers` processes to reuse;
+    without one, a pool is started for this call only.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    ranges = shard_ranges(len(partial_joints_np), workers)
+    if pool is None:
+        with open_pool(len(ranges), threads_per_worker) as pool:
+            return fit_frames_sharded(partial_joints_np, smplx_model_path, fit_fn, fit_kwargs, workers,
+                                      overlap=overlap, pool=pool)
+    futures = [
+        pool.submit(_fit_shard, partial_joints_np, smplx_model_path, fit_fn, fit_kwargs,
+                    start, stop, max(0, start - overlap))
+        for start, stop in ranges
+    ]
+    return concatenate_results([future.result() for future in futures])
@@ -0,0 +1,207 @@
+import hashlib
+import itertools
+import contextlib
+import numpy as np
+from checkpoint import iter_fitted_chunks
+from joint_forward import get_joint_evaluator
+from model_cache import get_model
+from parallel_fit import fit_frames_sharded, open_pool
+from result_cache import fit_frames_cached
+from shape_estimation import estimate_betas, validate_betas
+from telemetry import frame_records
+from fitting import (
+    COLD_SCHEDULE,
+    IK_SCHEDULE,
+    LM_SCHEDULE,
+    LM_WARM_SCHEDULE,
+    WARM_SCHEDULE,
+    fit_frames_chunked,
+    fit_frames_keyframes,
+    fit_frames_warm_start,
+    fit_frames_windowed,
+    schedule_with_hand_pca,
+    schedule_with_tolerances,
+    slice_result,
+)
+
+# ─── Importable fitting pipeline ──────────────────────────────────────────────
+# Everything get_mesh_from_3dpoints.py does between loading the joints and writing the
+# outputs, callable from other code: fit_chunks() yields fitted result dicts chunk by
+# chunk as they finish and fit_sequence() yields one record per frame. Both take a
+# (T, J, 3) array or any iterable of (J, 3) frames, so a consumer can write or render the
+# first frames while the rest of the take is still being fitted.
+#
+#     for frame in fit_sequence(np.load("data/smplx_joints.npy"), "models", solver="lm"):
+#         render(frame["vertices"])
+
+FIT_MODES = {
+    "frames": fit_frames_chunked,
+    "warm_start": fit_frames_warm_start,
+    "windowed": fit_frames_windowed,
+    "keyframes": fit_frames_keyframes,
+}
+
+
+def build_schedules(solver="adam", ik_init=False, rel_tol=None, grad_tol=None, patience=None, hand_pca=0,
+                    full_hand_refine=True, compile="eager"):
+    """(cold, warm) fitting schedules for the solver settings of the command line."""
+    if solver == "lm":
+        cold, warm = LM_SCHEDULE, LM_WARM_SCHEDULE
+    elif solver == "adam":
+        cold, warm = IK_SCHEDULE if ik_init else COLD_SCHEDULE, WARM_SCHEDULE
+    else:
+        raise ValueError(f"Unknown solver {solver!r}, expected 'adam' or 'lm'")
+    cold = schedule_with_tolerances(cold, rel_tol, grad_tol, patience)
+    warm = schedule_with_tolerances(warm, rel_tol, grad_tol, patience)
+    if hand_pca > 0:
+        cold = schedule_with_hand_pca(cold, hand_pca, full_hand_refine)
+        warm = schedule_with_hand_pca(warm, hand_pca, full_hand_refine)
+    cold["compile"] = warm["compile"] = {"backend": compile}
+    return cold, warm
+
+
+def take_betas(partial_joints_np, smplx_model_path):
+    """Body shape of a take, estimated from its bone lengths and validated (see shape_estimation)."""
+    partial_joints_np = np.asarray(partial_joints_np)
+    evaluator = get_joint_evaluator(get_model(smplx_model_path), partial_joints_np.shape[1])
+    betas = estimate_betas(partial_joints_np, evaluator)
+    return validate_betas(partial_joints_np, smplx_model_path, betas)
+
+
+def _stream_chunks(frames, fit_chunk, chunk_size, overlap):
+    """iter_fitted_chunks for an iterator of single frames (no checkpoints)."""
+    history = None
+    start = 0
+    while True:
+        chunk = np.asarray(list(itertools.islice(frames, chunk_size)))
+        if not len(chunk):
+            return
+        inputs = chunk if history is None else np.concatenate([history, chunk])
+        yield start, slice_result(fit_chunk(inputs), len(inputs) - len(chunk))
+        history = inputs[len(inputs) - overlap:] if overlap else None
+        start += len(chunk)
+
+
+def fit_chunks(
+    frames,
+    smplx_model_path,
+    mode="frames",
+    solver="adam",
+    schedule=None,
+    warm_schedule=None,
+    betas=None,
+    batch_size=1,
+    chunk_size=100,
+    workers=1,
+    threads_per_worker=None,
+    shard_overlap=8,
+    cache=None,
+    checkpoint_dir=None,
+    resume=False,
+    take=None,
+    **options,
+):
+    """
+    Fit frames, a (T, J, 3) array or an iterable of (J, 3) frames, chunk_size frames at a
+    time and yield (start, fit) for every chunk as soon as it is done, fit being the result
+    dict of frames start..start+len (see fitting.fit_frames_batched).
+
+    mode picks the fit function in FIT_MODES; options go to it (window, velocity_weight,
+    extrapolate, motion_threshold, ...). batch_size is the frames per batch, or the number
+    of lanes for "warm_start". schedule / warm_schedule default to build_schedules(solver).
+    betas=None estimates the shape from the take, or from its first chunk when frames is
+    not an array. workers > 1 fits every chunk in one pool of that many processes (see
+    parallel_fit.fit_frames_sharded), a chunk then holding chunk_size frames per worker;
+    sequential modes warm up on the shard_overlap frames before every shard and chunk.
+    cache: a result_cache.ResultCache, "frames" mode only; betas close to those of an
+    earlier run of the same take are replaced by them (see ResultCache.stable_betas),
+    the take being named by take (default: a hash of the first chunk of frames).
+    checkpoint_dir / resume (see checkpoint.iter_fitted_chunks) need frames as an array.
+    """
+    if mode not in FIT_MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {sorted(FIT_MODES)}")
+    if cache is not None and mode != "frames":
+        raise ValueError("Only independent per-frame fits (mode 'frames') can be cached")
+    is_array = isinstance(frames, np.ndarray)
+    if (checkpoint_dir or resume) and not is_array:
+        raise ValueError("Checkpoints need the whole take as an array")
+    if schedule is None or warm_schedule is None:
+        default_cold, default_warm = build_schedules(solver)
+        schedule = default_cold if schedule is None else schedule
+        warm_schedule = default_warm if warm_schedule is None else warm_schedule
+
+    if not is_array:
+        frames = iter(frames)
+    if betas is None:
+        if is_array:
+            betas = take_betas(frames, smplx_model_path)
+        else:
+            first = list(itertools.islice(frames, chunk_size))
+            if not first:
+                return
+            betas = take_betas(np.asarray(first), smplx_model_path)
+            frames = itertools.chain(first, frames)
+
+    if cache is not None:
+        if take is None:
+            first = frames[:chunk_size] if is_array else np.asarray(list(itertools.islice(frames, chunk_size)))
+            take = hashlib.sha1(np.ascontiguousarray(first, dtype=np.float64).tobytes()).hexdigest()
+            if not is_array:
+                frames = itertools.chain(first, frames)
+        betas = cache.stable_betas(betas, take, smplx_model_path)
+
+    fit_fn = FIT_MODES[mode]
+    fit_kwargs = dict(options, betas=betas)
+    if mode == "warm_start":
+        fit_kwargs.update(n_lanes=batch_size, cold_schedule=schedule, warm_schedule=warm_schedule)
+    else:
+        fit_kwargs.update(schedule=schedule)
+        if mode != "windowed":
+            fit_kwargs.update(batch_size=batch_size)
+    # only sequential modes profit from warming up on the frames before a shard / chunk
+    warmup = 0 if mode in ("frames", "keyframes") else shard_overlap
+
+    pool = None
+
+    def fit_frames(chunk):
+        if pool is not None:
+            return fit_frames_sharded(chunk, smplx_model_path, fit_fn, fit_kwargs, workers, overlap=warmup, pool=pool)
+        return fit_fn(chunk, smplx_model_path, **fit_kwargs)
+
+    def fit_frames_with_cache(chunk):
+        return fit_frames_cached(chunk, smplx_model_path, fit_frames, cache, settings={"schedule": schedule},
+                                 missing_threshold=options.get("missing_threshold", 1e-6),
+                                 device=options.get("device"), betas=betas)
+
+    fit_chunk = fit_frames if cache is None else fit_frames_with_cache
+
+    with open_pool(workers, threads_per_worker) if workers > 1 else contextlib.nullcontext() as pool:
+        # every worker fits a shard of chunk_size frames, started once for the whole run
+        chunk_frames = chunk_size * max(workers, 1)
+        if is_array:
+            # a resumed run must fit the remaining chunks exactly like the checkpointed ones
+            settings = dict(mode=mode, schedule=schedule, betas=betas, batch_size=batch_size,
+                            shard_overlap=warmup, options=options)
+            if mode == "warm_start":
+                settings.update(warm_schedule=warm_schedule)
+            yield from iter_fitted_chunks(frames, smplx_model_path, fit_chunk, checkpoint_dir, chunk_frames,
+                                          resume, warmup, settings)
+        else:
+            yield from _stream_chunks(frames, fit_chunk, chunk_frames, warmup)
+
+
+def fit_sequence(frames, smplx_model_path, **kwargs):
+    """
+    fit_chunks (same arguments) one frame at a time: yields {"frame", "params" (name ->
+    (size,)), "joints" (J, 3), "vertices" (V, 3), "diagnostics"} per frame in order, the
+    diagnostics being the telemetry record of the frame (see telemetry.frame_records).
+    """
+    for start, fit in fit_chunks(frames, smplx_model_path, **kwargs):
+        for t, record in enumerate(frame_records(fit, start)):
+            yield {
+                "frame": start + t,
+                "params": {name: p[t] for name, p in fit["params"].items()},
+                "joints": fit["joints"][t],
+                "vertices": fit["vertices"][t],
+                "diagnostics": record,
+            }
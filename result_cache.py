@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from model_cache import source_model_file
+from fitting import LOSS_STAGES, POSE_PARAM_SIZES, TIMED_STAGES, allocate_result, evaluate_params, scatter_result
+
+# ─── Content-addressed cache of fitted frames ─────────────────────────────────
+# A rerun after a small change (a few corrected input frames, another smoothing cutoff)
+# should not refit the whole take. Every fitted frame's parameters are stored under a
+# hash of its input joints, the model file's content and the fit settings
+# (<cache_dir>/<key[:2]>/<key>.npy, ~0.7 KB each). Later runs only fit the frames whose
+# key is not stored yet; cached frames are decoded with one batched forward. Reading a
+# frame refreshes its file time, and evict() removes the least recently used frames
+# once the cache is larger than its size limit.
+# Only per-frame fits are cached: warm-start, windowed and keyframe fits depend on the
+# neighbouring frames.
+# The betas are part of every key, but they are re-estimated from the whole take on
+# every run, so editing a single frame moves them slightly. stable_betas() therefore
+# keeps one betas entry per take (named by the caller, e.g. its input file) and model,
+# <cache_dir>/betas/<key>.npy, and reuses it while new estimates stay within
+# BETAS_TOLERANCE. These entries count towards the size limit and are evicted like frames.
+
+# bump when a code change alters fitted results, so old entries stop matching
+CACHE_VERSION = 1
+
+# largest per-component difference (in shape standard deviations) to reuse stored betas
+BETAS_TOLERANCE = 0.05
+
+_FINGERPRINTS = {}
+
+
+def model_fingerprint(model_path, gender="male"):
+    """sha1 of the SMPL-X model file, computed once per process and file version."""
+    source = source_model_file(model_path, gender)
+    stat = os.stat(source)
+    key = (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+    if key not in _FINGERPRINTS:
+        digest = hashlib.sha1()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _FINGERPRINTS[key] = digest.hexdigest()
+    return _FINGERPRINTS[key]
+
+
+class ResultCache:
+    """Fitted parameters per frame, keyed by frame_keys(), with an LRU size limit."""
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def frame_keys(self, partial_joints_np, smplx_model_path, settings, gender="male"):
+        """One hex key per frame from its joints, the model content and the settings dict."""
+        prefix = hashlib.sha1(json.dumps(
+            {"version": CACHE_VERSION, "model": model_fingerprint(smplx_model_path, gender), "settings": settings},
+            sort_keys=True, default=lambda value: np.asarray(value).tolist(),
+        ).encode())
+        keys = []
+        for frame in np.asarray(partial_joints_np, dtype=np.float64):
+            digest = prefix.copy()
+            digest.update(np.ascontiguousarray(frame).tobytes())
+            keys.append(digest.hexdigest())
+        return keys
+
+    def stable_betas(self, betas, take, smplx_model_path, gender="male", tolerance=BETAS_TOLERANCE):
+        """
+        The betas stored for take (a string naming the input, e.g. its file path) and this
+        model if no component differs from betas by more than tolerance; otherwise betas,
+        which replace the stored ones.
+        """
+        betas = np.asarray(betas, dtype=np.float64)
+        key = hashlib.sha1(json.dumps({"model": model_fingerprint(smplx_model_path, gender), "take": take}).encode())
+        path = os.path.join(self.cache_dir, "betas", f"{key.hexdigest()}.npy")
+        try:
+            stored = np.load(path)
+        except (OSError, ValueError):
+            stored = None
+        if stored is not None and stored.shape == betas.shape and np.abs(stored - betas).max() <= tolerance:
+            os.utime(path)  # recently used
+            return stored
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, betas)
+        os.replace(tmp, path)
+        return betas
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def load(self, key):
+        """Stored (P,) parameter vector of key, or None."""
+        path = self._path(key)
+        try:
+            params = np.load(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)  # recently used
+        self.hits += 1
+        return params
+
+    def store(self, key, params):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, np.asarray(params, dtype=np.float32))
+        os.replace(tmp, path)
+
+    def evict(self):
+        """Delete the least recently used frames until the cache fits max_bytes. Returns the count."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".npy"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+
+def fit_frames_cached(
+    partial_joints_np,
+    smplx_model_path,
+    fit_frames,
+    cache,
+    settings,
+    missing_threshold=1e-6,
+    device=None,
+    betas=None,
+):
+    """
+    fit_frames(frames) -> result dict (see fitting.fit_frames_batched) for the frames
+    missing from cache; their parameters are stored afterwards. The cached frames are
+    evaluated from their stored parameters. settings must describe everything else that
+    changes the fitted result (the schedule); joints, model, betas and missing_threshold
+    are part of the key already.
+    Returns the result dict of all frames plus "cached" (T,) bool.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    n_frames = len(partial_joints_np)
+    keys = cache.frame_keys(partial_joints_np, smplx_model_path,
+                            dict(settings, betas=betas, missing_threshold=missing_threshold))
+    stored = [cache.load(key) for key in keys]
+    hit = np.array([t for t in range(n_frames) if stored[t] is not None], dtype=int)
+    miss = np.array([t for t in range(n_frames) if stored[t] is None], dtype=int)
+    print(f"\n=== Result cache: {len(hit)}/{n_frames} frames cached, fitting {len(miss)} ===")
+
+    result = None
+    names, sizes = list(POSE_PARAM_SIZES), list(POSE_PARAM_SIZES.values())
+    if len(miss):
+        fit = fit_frames(partial_joints_np[miss])
+        vectors = np.concatenate([fit["params"][name] for name in names], axis=1)
+        for t, vector in zip(miss, vectors):
+            cache.store(keys[t], vector)
+        result = allocate_result(fit, n_frames)
+        scatter_result(result, fit, miss)
+
+    if len(hit):
+        start = time.perf_counter()
+        vectors = np.stack([stored[t] for t in hit])
+        params = dict(zip(names, np.split(vectors, np.cumsum(sizes)[:-1], axis=1)))
+        cached = evaluate_params(partial_joints_np[hit], smplx_model_path, params, missing_threshold, device, betas)
+        cached["iterations"] = {stage: np.zeros(len(hit), dtype=int) for stage in (result or {}).get("iterations", {})}
+        cached["timings"] = {stage: np.zeros(len(hit)) for stage in TIMED_STAGES}
+        cached["timings"]["output"][:] = (time.perf_counter() - start) / len(hit)
+        cached["stage_loss"] = {stage: np.full(len(hit), np.nan) for stage in LOSS_STAGES}
+        cached["lbfgs_failed"] = np.zeros(len(hit), dtype=bool)
+        if result is None:
+            result = allocate_result(cached, n_frames)
+        scatter_result(result, cached, hit)
+
+    result["cached"] = np.zeros(n_frames, dtype=bool)
+    result["cached"][hit] = True
+    return result
@@ -0,0 +1,84 @@
+import numpy as np
+from fitting import IK_SCHEDULE, fit_frames_batched
+
+# ─── Per-sequence shape estimation ────────────────────────────────────────────
+# The body shape is the same in every frame of a take, and the length of a bone
+# between two observed joints does not depend on the pose. The betas are therefore
+# estimated once per sequence from the median observed bone lengths: the rest-pose
+# bone vectors are linear in the betas, so a few Gauss-Newton steps on the bone
+# lengths (with a small ridge term for the shape directions the skeleton does not
+# constrain) give the shape in closed form. validate_betas then fits a few frames with
+# that shape and with the mean shape and keeps the better one. The pose fit keeps the
+# chosen betas fixed for every frame.
+
+
+def observed_bone_lengths(partial_joints_np, parents, missing_threshold=1e-6):
+    """
+    Median length of every bone (joint, parent) whose two ends are observed in at least
+    one frame. Returns (pairs (B, 2) int array, lengths (B,)).
+    """
+    partial_joints_np = np.asarray(partial_joints_np, dtype=np.float64)
+    valid = np.linalg.norm(partial_joints_np, axis=-1) > missing_threshold
+    pairs, lengths = [], []
+    for j, p in enumerate(parents[: partial_joints_np.shape[1]]):
+        if p < 0:
+            continue
+        both = valid[:, j] & valid[:, p]
+        if both.any():
+            bone = partial_joints_np[both, j] - partial_joints_np[both, p]
+            pairs.append((j, p))
+            lengths.append(np.median(np.linalg.norm(bone, axis=-1)))
+    return np.array(pairs, dtype=int).reshape(-1, 2), np.array(lengths)
+
+
+def estimate_betas(partial_joints_np, evaluator, missing_threshold=1e-6, regularization=1e-4, n_iter=10):
+    """
+    (n_betas,) shape of the sequence partial_joints_np (T, n_joints, 3).
+    evaluator: joint_forward.JointEvaluator of the model that will be fitted
+    regularization: ridge weight pulling the betas towards the mean shape
+    """
+    template, shapedirs, parents = (t.double().cpu().numpy() for t in evaluator.rest_basis())
+    pairs, lengths = observed_bone_lengths(partial_joints_np, parents.astype(int), missing_threshold)
+    betas = np.zeros(shapedirs.shape[-1])
+    if not len(pairs):
+        print("No observed bones, keeping the mean shape")
+        return betas
+
+    bone_template = template[pairs[:, 0]] - template[pairs[:, 1]]  # (B, 3)
+    bone_dirs = shapedirs[pairs[:, 0]] - shapedirs[pairs[:, 1]]  # (B, 3, n_betas)
+    eye = np.eye(len(betas))
+    for _ in range(n_iter):
+        bone = bone_template + bone_dirs @ betas
+        length = np.linalg.norm(bone, axis=-1)
+        # d|bone|/dbetas = unit(bone)^T d bone/dbetas
+        jac = np.einsum("bc,bcl->bl", bone / length[:, None], bone_dirs)
+        step = np.linalg.solve(jac.T @ jac + regularization * eye, jac.T @ (lengths - length) - regularization * betas)
+        betas = betas + step
+        if np.abs(step).max() < 1e-6:
+            break
+
+    final = np.linalg.norm(bone_template + bone_dirs @ betas, axis=-1)
+    print(f"Estimated betas from {len(pairs)} bones: mean bone length error "
+          f"{np.abs(np.linalg.norm(bone_template, axis=-1) - lengths).mean():.4f} → {np.abs(final - lengths).mean():.4f}")
+    return betas
+
+
+def validate_betas(partial_joints_np, smplx_model_path, betas, n_frames=8, missing_threshold=1e-6, device=None):
+    """
+    betas if fitting n_frames frames evenly spread over the sequence with them gives a lower
+    mean residual than the mean shape, zeros otherwise. Bone lengths say nothing about the
+    bones between unobserved joints, so an estimate can still be worse for the full pose.
+    """
+    partial_joints_np = np.asarray(partial_joints_np)
+    frames = np.unique(np.linspace(0, len(partial_joints_np) - 1, n_frames).round().astype(int))
+    mean_shape = np.zeros_like(betas)
+    residual = {}
+    for name, candidate in (("mean shape", mean_shape), ("estimated", betas)):
+        fit = fit_frames_batched(
+            partial_joints_np[frames], smplx_model_path, missing_threshold, device,
+            schedule=IK_SCHEDULE, betas=candidate,
+        )
+        residual[name] = fit["residual"].mean()
+    print(f"Shape check on {len(frames)} frames: mean residual {residual['mean shape']:.6f} with the mean shape, "
+          f"{residual['estimated']:.6f} with the estimated betas")
+    return betas if residual["estimated"] < residual["mean shape"] else mean_shape
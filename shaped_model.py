@@ -0,0 +1,229 @@
+import os
+import hashlib
+import weakref
+import numpy as np
+import torch
+from smplx.lbs import batch_rigid_transform, batch_rodrigues, vertices2joints, vertices2landmarks
+from joint_forward import NUM_KINEMATIC_JOINTS, pose_rotations, posed_joints
+from model_cache import get_model, source_model_file
+
+# ─── SMPL-X with the body shape baked in ──────────────────────────────────────
+# The betas are fixed for a whole sequence, yet every smplx forward recomputes
+# v_template + shapedirs @ betas and regresses the rest joints from the shaped mesh.
+# A ShapedModel does that once: it holds the shaped vertices, the rest joint locations
+# and the rows of the pose-corrective basis that belong to the landmark joints, so its
+# forward passes only pose and skin. The shaped template is also stored on disk next
+# to the model (<model stem>_shaped/<betas hash>.pt) and reused by later runs.
+# joints_jacobian() differentiates the joints analytically for the LM solver.
+
+_SHAPED_MODELS = weakref.WeakKeyDictionary()
+
+
+def shaped_template_file(model_path, betas, gender="male"):
+    """Path of the on-disk shaped template of the model for these betas."""
+    source = source_model_file(model_path, gender)
+    key = hashlib.sha1(np.asarray(betas, dtype=np.float32).tobytes()).hexdigest()[:16]
+    return os.path.join(os.path.splitext(source)[0] + "_shaped", f"{key}.pt")
+
+
+def compute_shaped_template(model, betas):
+    """
+    Shape-dependent part of the model for betas (n_betas,): shaped vertices (V, 3), rest
+    joints (55, 3) and the pose-corrective rows of the vertex based joints (P, n_extra*3).
+    """
+    betas = torch.as_tensor(np.asarray(betas, dtype=np.float32), device=model.v_template.device)
+    betas = betas[: model.shapedirs.shape[-1]].reshape(1, -1)
+    v_shaped = model.v_template + torch.einsum("bl,mkl->bmk", betas, model.shapedirs)
+    extra_idx = model.vertex_joint_selector.extra_joints_idxs
+    posedirs = model.posedirs.view(model.posedirs.shape[0], -1, 3)[:, extra_idx]
+    return {
+        "betas": betas[0].cpu(),
+        "v_shaped": v_shaped[0].cpu(),
+        "joints": vertices2joints(model.J_regressor, v_shaped)[0].cpu(),
+        "landmark_posedirs": posedirs.reshape(model.posedirs.shape[0], -1).cpu(),
+    }
+
+
+def load_shaped_template(model, model_path, betas, gender="male"):
+    """compute_shaped_template, read from / written to the on-disk cache."""
+    path = shaped_template_file(model_path, betas, gender)
+    source = source_model_file(model_path, gender)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+        try:
+            return torch.load(path, weights_only=True)
+        except Exception as e:
+            print(f"Could not load shaped template {path} ({e}), computing it again")
+    template = compute_shaped_template(model, betas)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"  # sharded workers may write the same template at once
+    torch.save(template, tmp)
+    os.replace(tmp, path)
+    return template
+
+
+class ShapedModel(torch.nn.Module):
+    """
+    SMPL-X forward for one fixed shape. joints() gives the first n_joints joints for the
+    fitting loop, forward() the full mesh and joints; both equal smplx_forward with the
+    template's betas (face pose and expression at zero).
+    """
+
+    def __init__(self, model, template, n_joints=76):
+        super().__init__()
+        extra_idx = model.vertex_joint_selector.extra_joints_idxs
+        n_extra = n_joints - NUM_KINEMATIC_JOINTS
+        if not 0 <= n_extra <= len(extra_idx):
+            raise ValueError(f"ShapedModel supports at most {NUM_KINEMATIC_JOINTS + len(extra_idx)} joints, "
+                             f"got {n_joints}")
+        device = model.v_template.device
+        self.n_joints = n_joints
+        self.use_pca = model.use_pca
+        self.model = [model]  # plain list: borrow the full-mesh buffers without registering the module
+        self.register_buffer("betas", template["betas"].to(device))
+        self.register_buffer("v_shaped", template["v_shaped"].to(device))
+        self.register_buffer("J", template["joints"].to(device))
+        # landmark rows for the joints-only path
+        self.register_buffer("landmark_v_shaped", self.v_shaped[extra_idx[:n_extra]])
+        self.register_buffer("landmark_posedirs", template["landmark_posedirs"][:, : n_extra * 3].to(device))
+        self.register_buffer("landmark_lbs_weights", model.lbs_weights[extra_idx[:n_extra]])
+        self.register_buffer("parents", model.parents)
+        self.register_buffer("pose_mean", model.pose_mean)
+        if self.use_pca:
+            self.register_buffer("left_hand_components", model.left_hand_components)
+            self.register_buffer("right_hand_components", model.right_hand_components)
+        # ancestors[j, k]: joint j is a strict ancestor of joint k
+        parents = model.parents.tolist()
+        ancestors = torch.zeros((NUM_KINEMATIC_JOINTS, NUM_KINEMATIC_JOINTS), dtype=model.v_template.dtype, device=device)
+        for k in range(1, NUM_KINEMATIC_JOINTS):
+            ancestors[:, k] = ancestors[:, parents[k]]
+            ancestors[parents[k], k] = 1.0
+        self.register_buffer("ancestors", ancestors)
+
+    def joints(self, global_orient, body_pose, left_hand_pose, right_hand_pose, transl):
+        """(B, n_joints, 3) joints, the same as forward(...)[1][:, :n_joints]."""
+        rot_mats = pose_rotations(self, global_orient, body_pose, left_hand_pose, right_hand_pose)
+        joints = posed_joints(rot_mats, self.J[None], self.landmark_v_shaped[None], self.landmark_posedirs,
+                              self.landmark_lbs_weights, self.parents)
+        return joints + transl.unsqueeze(1)
+
+    def joints_jacobian(self, global_orient, body_pose, left_hand_pose, right_hand_pose, transl):
+        """
+        joints(...) (B, n_joints, 3) and their exact Jacobian (B, n_joints, 3, P) with respect to
+        the parameters concatenated in argument order (P = 3 + 63 + 2 * hand size + 3).
+        Rotating joint j by d(theta) turns everything below it about its posed location p_j
+        with the world angular velocity G_j Jr(phi_j) d(theta) (Jr: right Jacobian of SO(3),
+        phi_j: full axis-angle incl. the mean pose); the landmark vertices additionally move
+        through the pose correctives of joint j.
+        """
+        batch_size = global_orient.shape[0]
+        dtype, device = global_orient.dtype, global_orient.device
+        n_extra = self.n_joints - NUM_KINEMATIC_JOINTS
+        left_full, right_full = left_hand_pose, right_hand_pose
+        if self.use_pca:
+            left_full = left_hand_pose @ self.left_hand_components
+            right_full = right_hand_pose @ self.right_hand_components
+        face_pose = torch.zeros((batch_size, 9), dtype=dtype, device=device)
+        phi = (torch.cat([global_orient, body_pose, face_pose, left_full, right_full], dim=1) + self.pose_mean)
+        phi = phi.view(batch_size, NUM_KINEMATIC_JOINTS, 3)
+        rot_mats = batch_rodrigues(phi.reshape(-1, 3)).view(batch_size, -1, 3, 3)
+        J_transformed, A = batch_rigid_transform(rot_mats, self.J.expand(batch_size, -1, -1), self.parents, dtype=dtype)
+        G = A[..., :3, :3]
+        omega = G @ _right_jacobian(phi)  # (B, 55, 3, 3): world angular velocity per parameter
+
+        # kinematic joints: d p_k = omega_j x (p_k - p_j) for every strict ancestor j of k
+        lever = J_transformed[:, None, :, :] - J_transformed[:, :, None, :]  # (B, j, k, 3)
+        jac = torch.cross(omega[:, :, None, :, :], lever[..., None].expand(-1, -1, -1, -1, 3), dim=3)
+        jac = jac * self.ancestors[None, :, :, None, None]  # (B, j, k, 3, m)
+        jac = jac.permute(0, 2, 3, 1, 4)  # (B, k, 3, j, m)
+        joints = J_transformed
+
+        if n_extra:
+            ident = torch.eye(3, dtype=dtype, device=device)
+            pose_feature = (rot_mats[:, 1:] - ident).view(batch_size, -1)
+            v_posed = self.landmark_v_shaped + (pose_feature @ self.landmark_posedirs).view(batch_size, -1, 3)
+            # every joint's rigid transform applied to every landmark: (B, L, 55, 3)
+            X = torch.einsum("bjcd,bld->bljc", G, v_posed) + A[:, None, :, :3, 3]
+            w = self.landmark_lbs_weights
+            verts = torch.einsum("lj,bljc->blc", w, X)
+            # rigid part: omega_j x (sum over j and its descendants of w_i X_i - weight * p_j)
+            below = self.ancestors + torch.eye(NUM_KINEMATIC_JOINTS, dtype=dtype, device=device)
+            moved = torch.einsum("li,ji,blic->bljc", w, below, X)
+            weight = w @ below.T  # (L, 55)
+            arm = moved - weight[None, :, :, None] * J_transformed[:, None]
+            vjac = torch.cross(omega[:, None], arm[..., None].expand(-1, -1, -1, -1, 3), dim=3)  # (B, L, j, 3, m)
+            # pose correctives: d R_j = R_j [Jr_j e_m]x changes v_posed, which is skinned by sum_i w_i G_i
+            dR = torch.einsum("njab,njbcm->njacm", rot_mats[:, 1:], _skew_columns(_right_jacobian(phi[:, 1:])))
+            posedirs = self.landmark_posedirs.view(NUM_KINEMATIC_JOINTS - 1, 9, n_extra, 3)
+            dv_posed = torch.einsum("bjxm,jxlc->bljcm", dR.reshape(batch_size, -1, 9, 3), posedirs)
+            skin = torch.einsum("lj,bjcd->blcd", w, G)
+            vjac[:, :, 1:] = vjac[:, :, 1:] + torch.einsum("blcd,bljdm->bljcm", skin, dv_posed)
+            jac = torch.cat([jac, vjac.permute(0, 1, 3, 2, 4)], dim=1)
+            joints = torch.cat([joints, verts], dim=1)
+
+        jac = jac.reshape(batch_size, self.n_joints, 3, NUM_KINEMATIC_JOINTS * 3)
+        hand = 15 * 3
+        body_cols = jac[..., : 22 * 3]  # global_orient + body_pose
+        left_cols = jac[..., 25 * 3: 25 * 3 + hand]
+        right_cols = jac[..., 25 * 3 + hand:]
+        if self.use_pca:
+            left_cols = left_cols @ self.left_hand_components.T
+            right_cols = right_cols @ self.right_hand_components.T
+        transl_cols = torch.eye(3, dtype=dtype, device=device).expand(batch_size, self.n_joints, 3, 3)
+        jac = torch.cat([body_cols, left_cols, right_cols, transl_cols], dim=-1)
+        return joints + transl.unsqueeze(1), jac
+
+    def forward(self, global_orient, body_pose, left_hand_pose, right_hand_pose, transl):
+        """(vertices (B, V, 3), joints (B, J_model, 3)) of the full model."""
+        model = self.model[0]
+        batch_size = global_orient.shape[0]
+        dtype, device = global_orient.dtype, global_orient.device
+        rot_mats = pose_rotations(self, global_orient, body_pose, left_hand_pose, right_hand_pose)
+        ident = torch.eye(3, dtype=dtype, device=device)
+        pose_feature = (rot_mats[:, 1:] - ident).view(batch_size, -1)
+        v_posed = self.v_shaped + (pose_feature @ model.posedirs).view(batch_size, -1, 3)
+        J_transformed, A = batch_rigid_transform(rot_mats, self.J.expand(batch_size, -1, -1), self.parents, dtype=dtype)
+        T = (model.lbs_weights @ A.view(batch_size, NUM_KINEMATIC_JOINTS, 16)).view(batch_size, -1, 4, 4)
+        vertices = (T[..., :3, :3] @ v_posed.unsqueeze(-1)).squeeze(-1) + T[..., :3, 3]
+
+        lmk_faces_idx = model.lmk_faces_idx.unsqueeze(0).expand(batch_size, -1).contiguous()
+        lmk_bary_coords = model.lmk_bary_coords.unsqueeze(0).expand(batch_size, -1, -1)
+        landmarks = vertices2landmarks(vertices, model.faces_tensor, lmk_faces_idx, lmk_bary_coords)
+        joints = torch.cat([model.vertex_joint_selector(vertices, J_transformed), landmarks], dim=1)
+        offset = transl.unsqueeze(1)
+        return vertices + offset, joints + offset
+
+
+def _right_jacobian(phi):
+    """(..., 3, 3) right Jacobian of SO(3) at the axis-angle vectors phi (..., 3)."""
+    angle = phi.norm(dim=-1, keepdim=True)[..., None].clamp(min=1e-8)
+    K = _skew(phi)
+    ident = torch.eye(3, dtype=phi.dtype, device=phi.device)
+    a = (1 - torch.cos(angle)) / angle ** 2
+    b = (angle - torch.sin(angle)) / angle ** 3
+    return ident - a * K + b * (K @ K)
+
+
+def _skew(v):
+    """(..., 3, 3) cross-product matrices of v (..., 3)."""
+    x, y, z = v.unbind(-1)
+    zero = torch.zeros_like(x)
+    return torch.stack([zero, -z, y, z, zero, -x, -y, x, zero], dim=-1).view(v.shape + (3,))
+
+
+def _skew_columns(M):
+    """(..., 3, 3, m) cross-product matrices of the columns of M (..., 3, m)."""
+    return _skew(M.transpose(-1, -2)).permute(*range(M.dim() - 2), -2, -1, -3)
+
+
+def get_shaped_model(model_path, betas, n_joints=76, device=None, gender="male", **model_config):
+    """
+    ShapedModel of the get_model(model_path, gender, **model_config) model for betas,
+    built once per process and shape from the on-disk shaped template.
+    """
+    model = get_model(model_path, gender, device=device, **model_config)
+    key = (np.asarray(betas, dtype=np.float32).tobytes(), n_joints)
+    per_model = _SHAPED_MODELS.setdefault(model, {})
+    if key not in per_model:
+        template = load_shaped_template(model, model_path, betas, gender)
+        per_model[key] = ShapedModel(model, template, n_joints)
+    return per_model[key]
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+import numpy as np
+from benchmark import SCHEDULES, environment, run_isolated, silence_stdout
+from output_writer import OutputWriter
+from pipeline import fit_chunks, take_betas
+from fitting import FINGER_WEIGHT
+
+# ─── Accuracy vs speed sweep on the sample take ───────────────────────────────
+# The iteration budgets, learning rates and the finger weight of the schedules were
+# picked by hand. This sweep fits data/smplx_joints.npy with every configuration of a
+# grid (or of a JSON file) in a fresh process and reports the wall time, the residual
+# to the input joints, the distance to the reference fit data/all_joints.npy and the
+# smoothness of the fitted joints. Configurations that no other one beats in both time
+# and mean residual form the Pareto front. With --baseline, a previous results file is
+# compared run by run and the sweep fails when a configuration became slower or less
+# accurate than the given tolerances.
+#
+#     python sweep.py --bases ik lm --iter_scales 0.25 0.5 1 --finger_weights 2 5
+#
+# A --configs file holds a list of {"name", "base", "iter_scale", "lr_scale",
+# "finger_weight", "overrides": {stage: {key: value}}}; missing keys take the defaults.
+
+
+def sweep_schedule(base, iter_scale=1.0, lr_scale=1.0, finger_weight=FINGER_WEIGHT, overrides=None):
+    """Cold schedule of SCHEDULES[base] with scaled iteration budgets and learning rates."""
+    schedule = {stage: dict(cfg) for stage, cfg in SCHEDULES[base][0].items()}
+    for cfg in schedule.values():
+        for key in ("n_iter", "max_iter"):
+            if cfg.get(key):
+                cfg[key] = max(1, round(cfg[key] * iter_scale))
+        if "lr" in cfg:
+            cfg["lr"] *= lr_scale
+    schedule["loss"] = {"finger_weight": finger_weight}
+    for stage, values in (overrides or {}).items():
+        schedule.setdefault(stage, {}).update(values)
+    return schedule
+
+
+def config_name(config):
+    return (f"{config['base']} iter x{config['iter_scale']:g} lr x{config['lr_scale']:g} "
+            f"finger {config['finger_weight']:g}")
+
+
+def smoothness(joints):
+    """Mean joint acceleration |j[t+1] - 2 j[t] + j[t-1]| (metres / frame^2)."""
+    joints = np.asarray(joints, dtype=np.float64)
+    if len(joints) < 3:
+        return 0.0
+    return float(np.linalg.norm(joints[2:] - 2 * joints[1:-1] + joints[:-2], axis=-1).mean())
+
+
+def run_config(config):
+    """Fit the take with one configuration (executed in a fresh process). Returns config plus measurements."""
+    if not config["verbose"]:
+        silence_stdout()
+    partial = np.load(config["joints"])[:config["frames"]]
+    reference = np.load(config["reference"])[:config["frames"]]
+    schedule = sweep_schedule(config["base"], config["iter_scale"], config["lr_scale"], config["finger_weight"],
+                              config["overrides"])
+    residual_max = np.zeros(len(partial))
+    with tempfile.TemporaryDirectory() as out_dir:
+        writer = OutputWriter(None, os.path.join(out_dir, "joints.npy"), len(partial))
+        start = time.perf_counter()
+        for begin, fit in fit_chunks(partial, config["model"], schedule=schedule, betas=np.asarray(config["betas"]),
+                                     batch_size=config["batch_size"], chunk_size=len(partial)):
+            writer.write(begin, fit)
+            residual_max[begin:begin + len(fit["residual"])] = fit["residual_max"]
+        wall = time.perf_counter() - start
+        joints = np.array(writer.joints)
+        writer.close()
+    n_common = min(joints.shape[1], reference.shape[1])
+    distance = np.linalg.norm(joints[:, :n_common] - reference[:, :n_common], axis=-1)
+    return {
+        **{key: value for key, value in config.items() if key not in ("verbose", "betas")},
+        "wall_s": wall,
+        "fps": len(partial) / wall,
+        "iterations_mean": {stage: float(used.mean()) for stage, used in writer.iterations.items()},
+        "residual_mean": float(writer.residual.mean()),
+        "residual_max": float(residual_max.max()),
+        "reference_mean": float(distance.mean()),
+        "reference_max": float(distance.max()),
+        "smoothness": smoothness(joints),
+    }
+
+
+def pareto_front(runs, keys=("wall_s", "residual_mean")):
+    """Names of the runs that no other run matches or beats in all keys while beating it in one."""
+    front = []
+    for run in runs:
+        dominated = any(
+            all(other[k] <= run[k] for k in keys) and any(other[k] < run[k] for k in keys)
+            for other in runs if other is not run
+        )
+        if not dominated:
+            front.append(run["name"])
+    return front
+
+
+def regressions(runs, baseline, time_tol=0.1, accuracy_tol=0.02):
+    """Messages for runs slower or less accurate than the run of the same name in baseline."""
+    previous = {run["name"]: run for run in baseline["runs"]}
+    found = []
+    for run in runs:
+        old = previous.get(run["name"])
+        if old is None:
+            continue
+        if run["wall_s"] > old["wall_s"] * (1 + time_tol):
+            found.append(f"{run['name']}: {old['wall_s']:.2f}s → {run['wall_s']:.2f}s")
+        if run["residual_mean"] > old["residual_mean"] * (1 + accuracy_tol):
+            found.append(f"{run['name']}: residual {old['residual_mean']:.5f} → {run['residual_mean']:.5f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep fitting settings for accuracy vs speed on the sample take")
+    parser.add_argument("--model", type=str, default="models", help="Path to the SMPL-X model folder")
+    parser.add_argument("--joints", type=str, default="data/smplx_joints.npy", help="Input joints (default: sample take)")
+    parser.add_argument("--reference", type=str, default="data/all_joints.npy",
+                        help="Reference fit of the same take (default: data/all_joints.npy)")
+    parser.add_argument("--frames", type=int, default=None, help="Only fit the first this many frames (default: all)")
+    parser.add_argument("--bases", choices=sorted(SCHEDULES), nargs="+", default=["ik", "lm"],
+                        help="Base schedules (default: ik lm)")
+    parser.add_argument("--iter_scales", type=float, nargs="+", default=[0.5, 1.0],
+                        help="Factors on every iteration budget (default: 0.5 1)")
+    parser.add_argument("--lr_scales", type=float, nargs="+", default=[1.0],
+                        help="Factors on the Adam learning rates (default: 1)")
+    parser.add_argument("--finger_weights", type=float, nargs="+", default=[FINGER_WEIGHT],
+                        help=f"Finger joint loss weights (default: {FINGER_WEIGHT:g})")
+    parser.add_argument("--configs", type=str, default=None, help="JSON list of configurations instead of the grid")
+    parser.add_argument("--batch_size", type=int, default=32, help="Frames per batch (default: 32)")
+    parser.add_argument("--zero_betas", action="store_true", help="Fit with the mean shape")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Earlier results file; exit with an error when a configuration regressed")
+    parser.add_argument("--time_tol", type=float, default=0.1,
+                        help="Allowed relative wall time increase against --baseline (default: 0.1)")
+    parser.add_argument("--accuracy_tol", type=float, default=0.02,
+                        help="Allowed relative mean residual increase against --baseline (default: 0.02)")
+    parser.add_argument("--out", type=str, default="sweep_results.json", help="JSON results file")
+    parser.add_argument("--verbose", action="store_true", help="Show the fitting log")
+    args = parser.parse_args()
+
+    partial = np.load(args.joints)
+    frames = len(partial) if args.frames is None else min(args.frames, len(partial))
+    betas = np.zeros(10) if args.zero_betas else take_betas(partial[:frames], args.model)
+
+    defaults = dict(iter_scale=1.0, lr_scale=1.0, finger_weight=FINGER_WEIGHT, overrides={})
+    if args.configs:
+        with open(args.configs) as f:
+            configs = [{**defaults, **config} for config in json.load(f)]
+    else:
+        grid = itertools.product(args.bases, args.iter_scales, args.lr_scales, args.finger_weights)
+        configs = [dict(defaults, base=base, iter_scale=iters, lr_scale=lr, finger_weight=weight)
+                   for base, iters, lr, weight in grid]
+
+    runs = []
+    for config in configs:
+        config = dict(config, name=config.get("name") or config_name(config), model=args.model, joints=args.joints,
+                      reference=args.reference, frames=frames, batch_size=args.batch_size,
+                      betas=np.asarray(betas).tolist(), verbose=args.verbose)
+        result = run_isolated(config, run_config)
+        runs.append(result)
+        print(f"{result['name']:40s} {result['wall_s']:7.2f}s  residual mean {result['residual_mean']:.5f} "
+              f"max {result['residual_max']:.4f}  reference {result['reference_mean']:.5f}  "
+              f"smoothness {result['smoothness']:.5f}", flush=True)
+        with open(args.out, "w") as f:
+            json.dump({"environment": environment(), "runs": runs}, f, indent=2)
+
+    front = pareto_front(runs)
+    reference = np.load(args.reference)[:frames]
+    with open(args.out, "w") as f:
+        json.dump({"environment": environment(), "reference_smoothness": smoothness(reference), "runs": runs,
+                   "pareto": front}, f, indent=2)
+    print(f"\nPareto front (wall time vs mean residual), reference smoothness {smoothness(reference):.5f}:")
+    for run in sorted((run for run in runs if run["name"] in front), key=lambda run: run["wall_s"]):
+        print(f"  {run['name']:40s} {run['wall_s']:7.2f}s  residual {run['residual_mean']:.5f}")
+    print(f"Saved {len(runs)} runs → {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(runs, json.load(f), args.time_tol, args.accuracy_tol)
+        for message in found:
+            print(f"Regression: {message}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import argparse
+import numpy as np
+import torch
+from smplx.vertex_ids import vertex_ids
+from fitting import POSE_PARAM_SIZES
+from shaped_model import get_shaped_model
+
+# ─── Synthetic SMPL-X stand-in ────────────────────────────────────────────────
+# The SMPL-X model files cannot be shipped with the repo, so benchmarks and smoke tests
+# run on a generated model instead: a .npz with the tensor shapes, keys and kinematic
+# tree of SMPL-X that smplx.create loads like the real file. Its rest skeleton has human
+# proportions, every joint owns a cluster of vertices (the fingertip, toe and face
+# landmark vertices sit where the vertex joints expect them), the shape and pose blend
+# shapes are random and small, and the hand PCA bases are random orthonormal matrices.
+# The mesh itself is not meant to be looked at (the faces are random).
+
+NUM_VERTICES = 10475
+NUM_FACES = 20908
+
+PARENTS = np.array([
+    -1, 0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 9, 12, 13, 14, 16, 17, 18, 19,
+    15, 15, 15,
+    20, 25, 26, 20, 28, 29, 20, 31, 32, 20, 34, 35, 20, 37, 38,
+    21, 40, 41, 21, 43, 44, 21, 46, 47, 21, 49, 50, 21, 52, 53,
+])
+
+# joints of the 76-joint layout that the stickman mapping leaves empty (all-zero rows)
+STICKMAN_MISSING_JOINTS = [3, 6, 9, 10, 11, 13, 14, 15, 22, 23, 24, 55, 56, 57, 60, 61, 62, 63, 64, 65]
+
+_FINGERTIPS = {"lthumb": 39, "lindex": 27, "lmiddle": 30, "lring": 36, "lpinky": 33,
+               "rthumb": 54, "rindex": 42, "rmiddle": 45, "rring": 51, "rpinky": 48}
+_LANDMARKS = [("nose", 15, (0, 0.02, 0.1)), ("reye", 15, (-0.03, 0.07, 0.08)),
+              ("leye", 15, (0.03, 0.07, 0.08)), ("rear", 15, (-0.08, 0.05, 0.0)),
+              ("lear", 15, (0.08, 0.05, 0.0)), ("LBigToe", 10, (0.0, -0.03, 0.1)),
+              ("LSmallToe", 10, (0.04, -0.03, 0.08)), ("LHeel", 7, (0, -0.08, -0.05)),
+              ("RBigToe", 11, (0.0, -0.03, 0.1)), ("RSmallToe", 11, (-0.04, -0.03, 0.08)),
+              ("RHeel", 8, (0, -0.08, -0.05))]
+
+
+def rest_joints():
+    """(55, 3) rest skeleton in metres, y up, the model's left along +x."""
+    J = np.zeros((55, 3))
+    left = {
+        1: (0.06, -0.09, 0.0), 4: (0.10, -0.46, 0.0), 7: (0.09, -0.86, -0.04), 10: (0.11, -0.92, 0.08),
+        13: (0.07, 0.42, 0.0), 16: (0.17, 0.44, 0.0), 18: (0.43, 0.43, -0.02), 20: (0.68, 0.43, 0.0),
+        23: (0.03, 0.65, 0.09),
+    }
+    for j, p in left.items():
+        J[j] = p
+    mirror = {2: 1, 5: 4, 8: 7, 11: 10, 14: 13, 17: 16, 19: 18, 21: 20, 24: 23}
+    for r, l in mirror.items():
+        J[r] = J[l] * (-1, 1, 1)
+    J[3] = (0, 0.11, 0)
+    J[6] = (0, 0.24, 0)
+    J[9] = (0, 0.30, 0)
+    J[12] = (0, 0.50, 0)
+    J[15] = (0, 0.58, 0.02)
+    J[22] = (0, 0.53, 0.04)
+    # left fingers: index, middle, pinky, ring, thumb (three joints each)
+    starts = {25: (0.77, 0.43, 0.03), 28: (0.775, 0.43, 0.01), 31: (0.76, 0.425, -0.035),
+              34: (0.77, 0.43, -0.012), 37: (0.71, 0.41, 0.04)}
+    for s, p in starts.items():
+        d = np.array([1.0, -0.05, 0.25 if s == 37 else 0.0])
+        d /= np.linalg.norm(d)
+        for k in range(3):
+            J[s + k] = np.array(p) + 0.03 * k * d
+    for k in range(15):
+        J[40 + k] = J[25 + k] * (-1, 1, 1)
+    return J
+
+
+def write_synthetic_model(model_dir, gender="male", seed=0):
+    """
+    Write a synthetic SMPLX_<GENDER>.npz into model_dir/smplx and return its path.
+    model_dir can then be used as the --model folder of every script.
+    """
+    rng = np.random.default_rng(seed)
+    J = rest_joints()
+    owner = rng.integers(0, 55, size=NUM_VERTICES)
+    owner[:55 * 4] = np.repeat(np.arange(55), 4)  # at least 4 vertices per joint
+    rng.shuffle(owner)
+    v = J[owner] + rng.normal(scale=0.01, size=(NUM_VERTICES, 3))
+    ids = vertex_ids["smplx"]
+    for name, j, offset in _LANDMARKS:
+        owner[ids[name]] = j
+    for name, j in _FINGERTIPS.items():
+        owner[ids[name]] = j
+
+    landmark = np.zeros(NUM_VERTICES, dtype=bool)
+    landmark[[ids[name] for name, _, _ in _LANDMARKS] + [ids[name] for name in _FINGERTIPS]] = True
+
+    # the regressor averages each joint's other vertices, shifted so that it reproduces J exactly
+    J_regressor = np.zeros((55, NUM_VERTICES))
+    for j in range(55):
+        members = np.where((owner == j) & ~landmark)[0]
+        J_regressor[j, members] = 1.0 / len(members)
+    v = v + (J - J_regressor @ v)[owner]
+    for name, j, offset in _LANDMARKS:
+        v[ids[name]] = J[j] + np.array(offset)
+    for name, j in _FINGERTIPS.items():
+        v[ids[name]] = J[j] + (J[j] - J[PARENTS[j]])  # one more phalanx past the last joint
+
+    weights = np.zeros((NUM_VERTICES, 55))
+    weights[np.arange(NUM_VERTICES), owner] = 0.8
+    weights[np.arange(NUM_VERTICES), np.maximum(PARENTS[owner], 0)] += 0.2
+    # 10 shape + 10 expression directions, coherent per joint so the betas change bone lengths
+    shapedirs = rng.normal(scale=0.01, size=(55, 3, 20))[owner] + rng.normal(scale=1e-4, size=(NUM_VERTICES, 3, 20))
+    posedirs = rng.normal(scale=1e-4, size=(NUM_VERTICES, 3, 54 * 9))
+    components_l = np.linalg.qr(rng.normal(size=(45, 45)))[0]
+    components_r = np.linalg.qr(rng.normal(size=(45, 45)))[0]
+    kintree = np.stack([PARENTS, np.arange(55)]).astype(np.int64)
+    kintree[0, 0] = 2 ** 32 - 1
+
+    path = os.path.join(model_dir, "smplx", f"SMPLX_{gender.upper()}.npz")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(
+        path,
+        v_template=v.astype(np.float32),
+        f=rng.integers(0, NUM_VERTICES, size=(NUM_FACES, 3)).astype(np.uint32),
+        J_regressor=J_regressor.astype(np.float32),
+        kintree_table=kintree,
+        weights=weights.astype(np.float32),
+        posedirs=posedirs.astype(np.float32),
+        shapedirs=shapedirs.astype(np.float32),
+        hands_componentsl=components_l.astype(np.float32),
+        hands_componentsr=components_r.astype(np.float32),
+        hands_meanl=rng.normal(scale=0.1, size=45).astype(np.float32),
+        hands_meanr=rng.normal(scale=0.1, size=45).astype(np.float32),
+        lmk_faces_idx=rng.integers(0, NUM_FACES, size=51).astype(np.int64),
+        lmk_bary_coords=np.full((51, 3), 1 / 3, dtype=np.float32),
+        dynamic_lmk_faces_idx=rng.integers(0, NUM_FACES, size=(79, 17)).astype(np.int64),
+        dynamic_lmk_bary_coords=np.full((79, 17, 3), 1 / 3, dtype=np.float32),
+    )
+    return path
+
+
+def synthetic_sequence(model_path, n_frames, seed=0, fps=30.0, betas=None, missing_joints=STICKMAN_MISSING_JOINTS):
+    """
+    Joints of a smooth random motion: every pose parameter oscillates around a random
+    rest value with its own frequency (0.2-1.5 Hz) and phase.
+    Returns (joints (n_frames, 76, 3) with the rows of missing_joints zeroed, like the
+    stickman mapping, and the ground-truth parameters name -> (n_frames, size)).
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_frames)[:, None] / fps
+    params = {}
+    for name, size in POSE_PARAM_SIZES.items():
+        scale = 0.1 if name == "transl" else 0.2
+        offset = rng.normal(scale=scale, size=size)
+        freq = rng.uniform(0.2, 1.5, size=size)
+        phase = rng.uniform(0, 2 * np.pi, size=size)
+        params[name] = (offset + scale * np.sin(2 * np.pi * freq * t + phase)).astype(np.float32)
+    shaped = get_shaped_model(model_path, np.zeros(10) if betas is None else betas, 76, torch.device("cpu"))
+    with torch.no_grad():
+        joints = shaped.joints(**{name: torch.from_numpy(p) for name, p in params.items()}).numpy().astype(np.float64)
+    joints[:, missing_joints] = 0.0
+    return joints, params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic SMPL-X stand-in model (and optionally a joint sequence)")
+    parser.add_argument("--model", type=str, default="models_synthetic", help="Model folder to write (default: ./models_synthetic)")
+    parser.add_argument("--gender", type=str, default="male", help="Gender in the file name (default: male)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--frames", type=int, default=0, help="Also write a synthetic joint sequence of this many frames")
+    parser.add_argument("--out_joints", type=str, default="data/synthetic_joints.npy", help="Path of the joint sequence")
+    args = parser.parse_args()
+
+    print(f"Wrote {write_synthetic_model(args.model, args.gender, args.seed)}")
+    if args.frames:
+        joints, _ = synthetic_sequence(args.model, args.frames, args.seed)
+        np.save(args.out_joints, joints)
+        print(f"Wrote {args.frames} frames of joints → {args.out_joints}")
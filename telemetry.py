@@ -0,0 +1,53 @@
+import json
+import numpy as np
+
+# ─── Per-frame fitting telemetry ──────────────────────────────────────────────
+# Opt-in JSON-lines stream with one record per fitted frame, written as chunks finish,
+# so slow or failing frames of long runs can be found with jq / pandas instead of by
+# reading the log. The records are built from the per-frame diagnostics every fit
+# result already carries, so a run without telemetry does no extra work.
+
+
+def _number(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and not np.isfinite(value):
+        return None  # NaN (stage not run) is not valid JSON
+    return value
+
+
+def frame_records(fit, start=0):
+    """One dict per frame of a fit result (see fitting.fit_frames_batched); frames numbered from start."""
+    n_frames = len(fit["residual"])
+    valid = fit["valid_mask"].sum(axis=1)
+    for t in range(n_frames):
+        yield {
+            "frame": start + t,
+            "valid_joints": int(valid[t]),
+            "residual": {
+                "min": _number(fit["residual_min"][t]) if "residual_min" in fit else None,
+                "mean": _number(fit["residual"][t]),
+                "max": _number(fit["residual_max"][t]) if "residual_max" in fit else None,
+            },
+            "iterations": {stage: _number(used[t]) for stage, used in fit["iterations"].items()},
+            "time_s": {stage: _number(seconds[t]) for stage, seconds in fit.get("timings", {}).items()},
+            "loss": {stage: _number(loss[t]) for stage, loss in fit.get("stage_loss", {}).items()},
+            "lbfgs_failed": bool(fit["lbfgs_failed"][t]) if "lbfgs_failed" in fit else None,
+            "interpolated": bool(fit["interpolated"][t]) if "interpolated" in fit else False,
+            "cached": bool(fit["cached"][t]) if "cached" in fit else False,
+        }
+
+
+class TelemetryWriter:
+    """Writes frame_records of every chunk handed to write(start, fit) to a .jsonl file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w")
+
+    def write(self, start, fit):
+        for record in frame_records(fit, start):
+            self.file.write(json.dumps(record) + "\n")
+        self.file.flush()  # records of finished chunks survive a killed run
+
+    def close(self):
+        self.file.close()
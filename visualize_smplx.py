@@ -1,7 +1,7 @@
 import numpy as np
 import plotly.graph_objects as go
 import os
-import smplx
+from model_cache import model_faces
 import argparse
 
 # ─── Arguments ────────────────────────────────────────────────
@@ -23,8 +23,7 @@ print(mesh.shape)
 print(joints.shape)
 # Load faces from the SMPL-X model
 
-model = smplx.create("models", model_type='smplx')
-faces = model.faces  # (F, 3)
+faces = model_faces("models")  # (F, 3)
 
 # ─── Plotly Mesh for the SMPL-X Body ───────────────────────────
 mesh_plot = go.Mesh3d(